@@ -0,0 +1,100 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Benchmark the parsing of the dates of /register
+#
+# Usage: python -m benchmarks.dates [-n 10000] [-r 5]
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, timedelta
+from random import Random
+from timeit import repeat
+from typing import List
+import click
+
+from reminderbot.dates import parse_date
+
+# Formats of strptime equivalent to the absolute formats of parse_date
+STRPTIME_FORMATS = [
+    "%d-%m-%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%d.%m.%Y %H:%M",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M",
+]
+
+
+def parse_strptime(date_str: str) -> datetime:
+    """Previous parsing: the documented format only"""
+    return datetime.strptime(date_str.strip(), "%d-%m-%Y %H:%M")
+
+
+def parse_strptime_formats(date_str: str) -> datetime:
+    """Trying each strptime format until one matches"""
+    date_str = date_str.strip()
+    for date_format in STRPTIME_FORMATS:
+        try:
+            return datetime.strptime(date_str, date_format)
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown date format: {date_str!r}")
+
+
+def build_dates(amount: int, date_format: str, seed: int = 0) -> List[str]:
+    """Random dates in a format, as the lines of a bulk /register"""
+    rng = Random(seed)
+    start_date = datetime(2021, 1, 1)
+    return [
+        (start_date + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))).strftime(
+            date_format
+        )
+        for _ in range(amount)
+    ]
+
+
+def build_mixed_dates(amount: int, seed: int = 0) -> List[str]:
+    """The absolute formats (equally distributed) and relative dates"""
+    rng = Random(seed)
+    absolute = [build_dates(amount, f, seed) for f in STRPTIME_FORMATS]
+    relative = [
+        (
+            f"{rng.choice(['today', 'tomorrow'])} {rng.randrange(24)}:{rng.randrange(60):02}"
+            if i % 2
+            else f"in {rng.randrange(1, 48)}{rng.choice('mhdw')}"
+        )
+        for i in range(amount)
+    ]
+    return [rng.choice(absolute + [relative])[i] for i in range(amount)]
+
+
+@click.command()
+@click.option("-n", "--amount", default=10000, help="Dates parsed per measure")
+@click.option("-r", "--repeats", default=5, help="Measures, the best one is kept")
+def main(amount: int, repeats: int) -> None:
+    def measure(func, dates: List[str]) -> float:
+        def run() -> None:
+            for date_str in dates:
+                func(date_str)
+
+        return min(repeat(run, number=1, repeat=repeats)) / len(dates) * 1e6
+
+    documented = build_dates(amount, STRPTIME_FORMATS[0])
+    year_first = build_dates(amount, STRPTIME_FORMATS[-1])
+    mixed = build_mixed_dates(amount)
+    absolute_mixed = [d for d in mixed if d[0].isdigit()]
+
+    click.echo(f"{'parser':>18} {'input':>16} {'per date':>10}")
+    for name, func, input_name, dates in (
+        ("strptime", parse_strptime, "dd-mm-yyyy", documented),
+        ("parse_date", parse_date, "dd-mm-yyyy", documented),
+        ("strptime formats", parse_strptime_formats, "yyyy-mm-ddTHH:MM", year_first),
+        ("parse_date", parse_date, "yyyy-mm-ddTHH:MM", year_first),
+        ("strptime formats", parse_strptime_formats, "mixed absolute", absolute_mixed),
+        ("parse_date", parse_date, "mixed absolute", absolute_mixed),
+        ("parse_date", parse_date, "mixed", mixed),
+    ):
+        elapsed = measure(func, dates)
+        click.echo(f"{name:>18} {input_name:>16} {elapsed:>8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
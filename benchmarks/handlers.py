@@ -0,0 +1,296 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Benchmark the command handlers end to end
+#
+# Usage: python -m benchmarks.handlers [-c reminderbot.cfg] [--db URI]
+#            [--chats 50] [--reminders 200] [-n 200] [--cold]
+#
+# The handlers are called with fake telegram updates against a database
+# seeded with random chats and reminders. Telegram is never contacted.
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, timedelta
+from random import Random
+from statistics import quantiles
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import click
+
+from sqlalchemy import event, select
+
+from reminderbot import conf
+from reminderbot.database import Database
+from reminderbot.dates import utc_now
+
+# Far from the real telegram chat IDs
+BENCHMARK_CHAT_ID_START = -(10**15)
+
+
+class FakeChat:
+    def __init__(self, chat_id: int, title: str) -> None:
+        self.id = chat_id
+        self.title = title
+
+
+class FakeMessage:
+    """Message with the methods used by the handlers, doing nothing"""
+
+    def __init__(self, chat: FakeChat, text: str = "") -> None:
+        self.chat = chat
+        self.chat_id = chat.id
+        self.message_id = 1
+        self.text = text
+        self.text_markdown_v2 = text
+
+    def reply_text(self, text: str, **kwargs) -> FakeMessage:
+        return FakeMessage(self.chat, text)
+
+    def reply_markdown_v2(self, text: str, **kwargs) -> FakeMessage:
+        return FakeMessage(self.chat, text)
+
+    def pin(self, **kwargs) -> bool:
+        return True
+
+    def delete(self, **kwargs) -> bool:
+        return True
+
+
+class FakeUpdate:
+    def __init__(self, chat: FakeChat, text: str) -> None:
+        self.message = FakeMessage(chat, text)
+        self.effective_message = self.message
+        self.effective_chat = chat
+
+
+class FakeBot:
+    def send_chat_action(self, **kwargs) -> bool:
+        return True
+
+    def delete_message(self, **kwargs) -> bool:
+        return True
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        return FakeMessage(FakeChat(chat_id, ""), text)
+
+
+class FakeContext:
+    def __init__(self) -> None:
+        self.bot = FakeBot()
+
+
+class QueryCounter:
+    """Count the queries sent to the database"""
+
+    def __init__(self, database: Database) -> None:
+        self.count = 0
+        event.listen(database.engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args) -> None:
+        self.count += 1
+
+
+class ErrorCounter(logging.Handler):
+    """Count the errors logged, the handlers catch their own exceptions"""
+
+    def __init__(self) -> None:
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.count += 1
+
+
+def seed(
+    database: Database, chats: int, reminders: int, rng: Random
+) -> List[Tuple[FakeChat, int, List[int]]]:
+    """
+    Create the chats with their reminders, half of them in the past
+
+    Returns:
+        List[Tuple[FakeChat, int, List[int]]]: Telegram chat, database chat ID
+            and IDs of its reminders
+    """
+
+    now = utc_now().replace(microsecond=0)
+    seeded = []
+    for i in range(chats):
+        chat = FakeChat(BENCHMARK_CHAT_ID_START - i, f"Benchmark chat {i}")
+        result = database.engine.execute(
+            database.chat.insert().values(chat_id=chat.id, name=chat.title)
+        )
+        chat_id = result.inserted_primary_key[0]
+
+        rows = [
+            {
+                "chat_id": chat_id,
+                "title": f"Event {j} (session #{rng.randint(1, 99)})",
+                "date": now
+                + timedelta(hours=rng.randint(-24 * 365, 24 * 365), seconds=j),
+                "text": "Bring dice, snacks and the character sheets!",
+            }
+            for j in range(reminders)
+        ]
+        if rows:
+            database.engine.execute(database.reminder.insert(), rows)
+
+        reminder_ids = [
+            row["id"]
+            for row in database.engine.execute(
+                database.reminder.select().where(database.reminder.c.chat_id == chat_id)
+            )
+        ]
+        seeded.append((chat, chat_id, reminder_ids))
+
+    return seeded
+
+
+def cleanup(database: Database, telegram_chat_ids: List[int]) -> None:
+    chat = database.chat
+    chat_ids = select([chat.c.id]).where(chat.c.chat_id.in_(telegram_chat_ids))
+    database.engine.execute(
+        database.reminder.delete().where(database.reminder.c.chat_id.in_(chat_ids))
+    )
+    database.engine.execute(chat.delete().where(chat.c.chat_id.in_(telegram_chat_ids)))
+
+
+def clear_caches() -> None:
+    from reminderbot.events import get_reply_cache
+    from reminderbot.utils import get_chat_cache, get_unregistered_chat_cache
+
+    get_chat_cache().clear()
+    get_unregistered_chat_cache().clear()
+    get_reply_cache().clear()
+
+
+def build_cases(
+    rng: Random,
+    seeded: List[Tuple[FakeChat, int, List[int]]],
+    telegram_chat_ids: List[int],
+) -> Dict[str, Tuple[Callable, Callable[[], FakeUpdate]]]:
+    """Handlers to benchmark with a builder of a random update for each of them"""
+    from reminderbot.events import (
+        list_events,
+        next_event,
+        pin_event,
+        search_events,
+        show_event,
+    )
+    from reminderbot.register import register_chat, register_event
+
+    def random_chat() -> Tuple[FakeChat, List[int]]:
+        chat, _chat_id, reminder_ids = rng.choice(seeded)
+        return chat, reminder_ids
+
+    def event_update() -> FakeUpdate:
+        chat, reminder_ids = random_chat()
+        return FakeUpdate(chat, f"/event {rng.choice(reminder_ids)}")
+
+    def register_update() -> FakeUpdate:
+        chat, _reminder_ids = random_chat()
+        date = datetime.now() + timedelta(days=rng.randint(1, 365))
+        return FakeUpdate(
+            chat,
+            f"/register {date:%d-%m-%Y %H:%M}|Benchmark {rng.randint(1, 10**9)}|Text",
+        )
+
+    def register_chat_update() -> FakeUpdate:
+        chat = FakeChat(BENCHMARK_CHAT_ID_START - len(telegram_chat_ids), "New chat")
+        telegram_chat_ids.append(chat.id)
+        return FakeUpdate(chat, "/register_chat")
+
+    return {
+        "next": (next_event, lambda: FakeUpdate(random_chat()[0], "/next")),
+        "list": (list_events, lambda: FakeUpdate(random_chat()[0], "/list 10")),
+        "list all": (list_events, lambda: FakeUpdate(random_chat()[0], "/list all")),
+        "event": (show_event, event_update),
+        "pin": (pin_event, lambda: FakeUpdate(random_chat()[0], "/pin")),
+        "search": (
+            search_events,
+            lambda: FakeUpdate(random_chat()[0], "/search session dice"),
+        ),
+        "register": (register_event, register_update),
+        "register_chat": (register_chat, register_chat_update),
+    }
+
+
+def get_benchmark_database(db: Optional[str]) -> Database:
+    """Database from `--db`, from the config or an in-memory SQLite database"""
+    if db:
+        conf._database = Database(db)
+    elif not conf.get_database().enabled:
+        conf._database = Database("sqlite://")
+
+    database = conf.get_database()
+    database.init_database()
+    return database
+
+
+@click.command()
+@click.option("-c", "--config", type=str, help="Use config file")
+@click.option("--db", type=str, help="Database URI (defaults to the config one)")
+@click.option("--chats", default=50, help="Chats to seed")
+@click.option("--reminders", default=200, help="Reminders to seed per chat")
+@click.option("-n", "--iterations", default=200, help="Calls per handler")
+@click.option(
+    "--cold", is_flag=True, default=False, help="Clear caches before each call"
+)
+@click.option("--seed", "random_seed", default=0, help="Seed of the random data")
+def main(
+    config: str,
+    db: str,
+    chats: int,
+    reminders: int,
+    iterations: int,
+    cold: bool,
+    random_seed: int,
+) -> None:
+    conf.read_configs(config)
+    rng = Random(random_seed)
+    error_counter = ErrorCounter()
+    logging.basicConfig(level=logging.ERROR, handlers=[error_counter])
+
+    database = get_benchmark_database(db)
+    counter = QueryCounter(database)
+    seeded = seed(database, chats, reminders, rng)
+    telegram_chat_ids = [chat.id for chat, _chat_id, _reminder_ids in seeded]
+    context = FakeContext()
+
+    try:
+        click.echo(
+            f"{'handler':>14} {'p50':>9} {'p90':>9} {'p99':>9}"
+            f" {'queries':>8} {'errors':>7}"
+        )
+        for name, (handler, build_update) in build_cases(
+            rng, seeded, telegram_chat_ids
+        ).items():
+            timings = []
+            queries = 0
+            errors = 0
+            for _ in range(iterations):
+                update = build_update()
+                if cold:
+                    clear_caches()
+
+                queries_before = counter.count
+                errors_before = error_counter.count
+                start = perf_counter()
+                try:
+                    handler(update, context)
+                except Exception:
+                    error_counter.count += 1
+                timings.append(perf_counter() - start)
+                queries += counter.count - queries_before
+                errors += error_counter.count > errors_before
+
+            p50, p90, p99 = (quantiles(timings, n=100)[i] * 1000 for i in (49, 89, 98))
+            click.echo(
+                f"{name:>14} {p50:>7.3f}ms {p90:>7.3f}ms {p99:>7.3f}ms"
+                f" {queries / iterations:>8.2f} {errors:>7}"
+            )
+    finally:
+        cleanup(database, telegram_chat_ids)
+
+
+if __name__ == "__main__":
+    main()
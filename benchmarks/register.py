@@ -0,0 +1,95 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Benchmark the database path of /register
+#
+# Usage: python -m benchmarks.register -c reminderbot.cfg [--db URI] [-n 500]
+#
+# Runs on the database of the config ([POSTGRES], initialized, or [SQLITE])
+# or the one of `--db`. The benchmark rows are created under a fake chat
+# and removed.
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, timedelta
+from statistics import mean, median
+from time import perf_counter
+from typing import Callable, Dict, List
+import click
+
+from sqlalchemy.exc import IntegrityError
+
+from reminderbot import conf
+from reminderbot.conf import read_configs, get_database
+from reminderbot.database import Database
+from reminderbot.register import register_event_db, update_event_db, upsert_event_db
+
+BENCHMARK_CHAT_ID = -1
+
+
+def two_statements(chat_id: int, date: datetime, title: str, message: str) -> None:
+    """Previous /register path: INSERT swallowing the conflict and then UPDATE"""
+    try:
+        register_event_db(chat_id=chat_id, date=date, title=title, message=message)
+    except IntegrityError:
+        pass
+    update_event_db(chat_id=chat_id, date=date, title=title, message=message)
+
+
+def run(func: Callable, amount: int, prefix: str) -> Dict[str, List[float]]:
+    """Register `amount` new events and update them again, timing each call"""
+    timings: Dict[str, List[float]] = {"new": [], "existing": []}
+    start_date = datetime(2000, 1, 1)
+    for step in ("new", "existing"):
+        for i in range(amount):
+            start = perf_counter()
+            func(
+                chat_id=BENCHMARK_CHAT_ID,
+                date=start_date + timedelta(hours=i),
+                title=f"{prefix} {i}",
+                message=f"{step} message {i}",
+            )
+            timings[step].append(perf_counter() - start)
+    return timings
+
+
+def cleanup() -> None:
+    database = get_database()
+    database.engine.execute(
+        database.reminder.delete().where(
+            database.reminder.c.chat_id == BENCHMARK_CHAT_ID
+        )
+    )
+
+
+@click.command()
+@click.option("-c", "--config", type=str, help="Use config file")
+@click.option("--db", type=str, help="Database URI (defaults to the config one)")
+@click.option("-n", "--amount", default=500, help="Events registered per path")
+def main(config: str, db: str, amount: int) -> None:
+    read_configs(config)
+    if db:
+        conf._database = Database(db)
+
+    database = get_database()
+    if not database.enabled:
+        raise click.ClickException("A [POSTGRES] or [SQLITE] database is required")
+    if database.is_sqlite:
+        # As the listener does, SQLite databases are created when used
+        database.init_database()
+
+    try:
+        for name, func in (
+            ("insert+update", two_statements),
+            ("upsert", upsert_event_db),
+        ):
+            for step, timings in run(func, amount, name).items():
+                click.echo(
+                    f"{name:>14} {step:>8}: mean {mean(timings) * 1000:.3f}ms"
+                    f" median {median(timings) * 1000:.3f}ms"
+                    f" total {sum(timings):.3f}s ({len(timings)} registrations)"
+                )
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
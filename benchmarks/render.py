@@ -0,0 +1,73 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Benchmark the MarkdownV2 rendering of the list of events
+#
+# Usage: python -m benchmarks.render [-n 10000] [-r 20]
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, timedelta
+from timeit import repeat
+from typing import Any, Dict, List
+import click
+
+from reminderbot.render import render_event_line, render_list_header
+
+
+def escape_chained_replace(message: str) -> str:
+    """Previous escaping: one `str.replace` (and copy) per reserved character"""
+    return (
+        message.replace("-", "\\-")
+        .replace("!", "\\!")
+        .replace(".", "\\.")
+        .replace("[", "\\[")
+        .replace("]", "\\]")
+        .replace("(", "\\(")
+        .replace(")", "\\)")
+    )
+
+
+def render_chained_replace(events: List[Dict[str, Any]]) -> str:
+    """Previous rendering: format every event and escape the whole list"""
+    event_texts = ["*All events:*\n"]
+    for event in events:
+        event_texts.append(
+            f"-\\[{event['date']}\\] *{event['title']}* _\\<{event['id']}\\>_"
+        )
+    return escape_chained_replace("\n".join(event_texts))
+
+
+def render_per_field(events: List[Dict[str, Any]]) -> str:
+    """Current rendering: escape the fields and compose the lines"""
+    event_texts = [render_list_header(0, "")]
+    for event in events:
+        event_texts.append(render_event_line(event))
+    return "\n".join(event_texts)
+
+
+def build_events(amount: int) -> List[Dict[str, Any]]:
+    start_date = datetime(2021, 1, 1, 20, 30)
+    return [
+        {
+            "id": i,
+            "date": start_date + timedelta(days=i),
+            "title": f"Session #{i}: (re)visiting the [old] ruins - again!",
+        }
+        for i in range(amount)
+    ]
+
+
+@click.command()
+@click.option("-n", "--amount", default=10000, help="Events in the list")
+@click.option("-r", "--repeats", default=20, help="Renders per measure")
+def main(amount: int, repeats: int) -> None:
+    events = build_events(amount)
+    for name, func in (
+        ("chained replace", render_chained_replace),
+        ("per field", render_per_field),
+    ):
+        best = min(repeat(lambda: func(events), number=repeats, repeat=5)) / repeats
+        click.echo(f"{name:>15}: {best * 1000:.3f}ms per list of {amount} events")
+
+
+if __name__ == "__main__":
+    main()
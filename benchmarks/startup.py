@@ -0,0 +1,97 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Benchmark the startup time of each mode of the listener
+#
+# Usage: python -m benchmarks.startup [-n 10]
+#
+# Each mode runs in a new interpreter, as the health checks and cron jobs do,
+# with a temporary config using a SQLite file. The bot itself is run until
+# the Updater rejects the fake token, so telegram is never contacted.
+###############################################################################
+from __future__ import annotations
+from os.path import join
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List, Tuple
+import json
+import subprocess
+import sys
+import click
+
+# Runs the listener with the arguments of argv and prints the loaded libraries
+RUNNER = """
+import json, sys
+from reminderbot.bot import listener
+try:
+    listener.main(sys.argv[1:], standalone_mode=False)
+except (SystemExit, Exception):
+    pass
+print(json.dumps([m for m in ("sqlalchemy", "telegram") if m in sys.modules]))
+"""
+
+CONFIG = """[DEFAULT]
+telegram_token: fake-token
+[LOGGING]
+level: CRITICAL
+[SQLITE]
+path: {path}
+[SCHEDULER]
+enabled: False
+"""
+
+
+def run_mode(args: List[str]) -> Tuple[float, List[str]]:
+    """Run the listener in a new interpreter, timing it from start to exit"""
+    start = perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", RUNNER, *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = perf_counter() - start
+    return elapsed, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@click.command()
+@click.option("-n", "--iterations", default=10, help="Runs per mode")
+def main(iterations: int) -> None:
+    with TemporaryDirectory() as tmp:
+        config = join(tmp, "reminderbot.cfg")
+        with open(config, "w") as cfg:
+            cfg.write(CONFIG.format(path=join(tmp, "reminderbot.db")))
+
+        modes = {
+            "--help": ["--help"],
+            "--init-config": ["-c", join(tmp, "new.cfg"), "--init-config"],
+            "--init_db": ["-c", config, "--init_db"],
+            "--migrate": ["-c", config, "--migrate"],
+            "bot": ["-c", config],
+        }
+
+        # Baseline of the interpreter itself
+        timings = []
+        for _ in range(iterations):
+            start = perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            timings.append(perf_counter() - start)
+        click.echo(f"{'mode':>14} {'median':>9} {'min':>9}  loaded")
+        click.echo(
+            f"{'python':>14} {median(timings) * 1000:>7.1f}ms"
+            f" {min(timings) * 1000:>7.1f}ms"
+        )
+
+        for name, args in modes.items():
+            timings = []
+            for _ in range(iterations):
+                elapsed, loaded = run_mode(args)
+                timings.append(elapsed)
+            click.echo(
+                f"{name:>14} {median(timings) * 1000:>7.1f}ms"
+                f" {min(timings) * 1000:>7.1f}ms  {', '.join(loaded) or '-'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
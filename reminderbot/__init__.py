@@ -1,4 +1,15 @@
-from reminderbot.register import REGISTER_HANDLERS
-from reminderbot.events import EVENTS_HANDLERS
+from typing import Any, List
 
-HANDLERS = REGISTER_HANDLERS + EVENTS_HANDLERS
+
+def __getattr__(name: str) -> Any:
+    # The handlers load telegram and the database modules,
+    # so they're only imported when the bot needs them
+    if name == "HANDLERS":
+        from reminderbot.register import REGISTER_HANDLERS
+        from reminderbot.events import EVENTS_HANDLERS
+
+        handlers: List = REGISTER_HANDLERS + EVENTS_HANDLERS
+        globals()["HANDLERS"] = handlers
+        return handlers
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
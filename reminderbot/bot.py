@@ -6,20 +6,30 @@
 # Descr: Telegram bot initializer
 ###############################################################################
 from __future__ import annotations
-from telegram.ext import Updater
+from typing import TYPE_CHECKING
 import logging
 import click
 
 # Self-imports
+# The rest of the bot is imported by the listener once it's needed,
+# so the maintenance options don't load telegram and the handlers
 from reminderbot.conf import (
     read_configs,
     init_configs,
     init_logger,
     get_telegram_token,
+    get_telegram_api_options,
+    get_webhook_options,
+    get_metrics_options,
+    get_slow_query_threshold,
     get_debug_enabled,
     get_database,
+    get_default_timezone,
 )
-from reminderbot import HANDLERS
+from reminderbot.dates import get_timezone
+
+if TYPE_CHECKING:
+    from telegram.ext import Dispatcher, Updater
 
 
 @click.command()
@@ -35,6 +45,12 @@ from reminderbot import HANDLERS
 @click.option(
     "--init_db", is_flag=True, default=False, help="Initialize the database and exit"
 )
+@click.option(
+    "--migrate",
+    is_flag=True,
+    default=False,
+    help="Apply the pending database migrations and exit",
+)
 @click.option(
     "-v",
     "--verbose",
@@ -55,7 +71,47 @@ from reminderbot import HANDLERS
     default=False,
     help="Set telegram token instead of using a config file",
 )
-def listener(config, init_config, init_db, verbose, debug, token) -> None:
+@click.option(
+    "--async",
+    "run_async",
+    is_flag=True,
+    default=False,
+    help="Run the handlers in a pool of --workers threads instead of one at a time",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Threads of the handlers pool with --async",
+)
+@click.option(
+    "--webhook",
+    is_flag=True,
+    default=False,
+    help="Receive the updates with a webhook ([WEBHOOK] config) instead of polling",
+)
+@click.option(
+    "--shards",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Worker processes handling the chats, split by chat ID",
+)
+def listener(
+    config,
+    init_config,
+    init_db,
+    migrate,
+    verbose,
+    debug,
+    token,
+    run_async,
+    workers,
+    webhook,
+    shards,
+) -> None:
     # Init configs
     read_configs(config)
 
@@ -69,6 +125,13 @@ def listener(config, init_config, init_db, verbose, debug, token) -> None:
         logger.info("The file 'reminderbot.cfg' has been created.")
         exit(-1)
 
+    # A wrong time zone would be stored for every new chat
+    try:
+        get_timezone(get_default_timezone())
+    except ValueError as err:
+        logger.critical(f"Wrong [DEFAULT] timezone in the config file: {err}")
+        exit(-1)
+
     # Init database
     database = get_database()
     if database.enabled:
@@ -80,6 +143,16 @@ def listener(config, init_config, init_db, verbose, debug, token) -> None:
 
             exit(0)
 
+        if migrate is True:
+            logger.info("Migrating database")
+            database.migrate()
+
+            exit(0)
+
+    if database.enabled and database.is_sqlite:
+        # SQLite needs no setup, an in-memory database is empty on every start
+        database.init_database()
+
     # Init listener
     if token:
         TOKEN = token
@@ -91,25 +164,132 @@ def listener(config, init_config, init_db, verbose, debug, token) -> None:
         )
         exit(-1)
     logger.debug("TOKEN: {}".format(TOKEN))
-    updater = Updater(TOKEN, use_context=True)
+
+    if shards > 1:
+        from reminderbot.shards import run_coordinator
+
+        if database.is_sqlite and database.connection_uri == "sqlite://":
+            logger.critical("The shards can't share an in-memory SQLite database")
+            exit(-1)
+
+        run_coordinator(
+            TOKEN,
+            shards,
+            webhook,
+            {
+                "config": config,
+                "verbose": verbose,
+                "debug": debug,
+                "run_async": run_async,
+                "workers": workers,
+            },
+        )
+        return
+
+    # Load the bot
+    from telegram.ext import Updater
+
+    from reminderbot.deletion import get_deletion_queue
+    from reminderbot.outbox import get_outbox
+    from reminderbot.shards import start_singleton_scheduler
+
+    updater = Updater(
+        TOKEN, use_context=True, workers=workers, **get_telegram_api_options()
+    )
+    init_bot(updater.dispatcher, run_async)
+
+    #   Deliver reminders, from a single process
+    if database.enabled:
+        start_singleton_scheduler(updater.bot, shard=0)
+
+    #   Listen till end
+    logger.info("ReminderBot has started!")
+    try:
+        listen(updater, webhook)
+    finally:
+        if database.enabled:
+            logger.info(f"Database pool: {database.pool_stats}")
+        logger.info(f"Message deletions: {get_deletion_queue().stats}")
+        logger.info(f"Outbox: {get_outbox().stats}")
+        logger.info(
+            "Shutting down\nBot is going to sleep (...)\nNo more reminders today (...)\nZzz"
+        )
+
+
+def init_bot(dispatcher: Dispatcher, run_async: bool, shard: int = 0) -> None:
+    """
+    Prepare the database, the metrics and the handlers of a dispatcher
+
+    Args:
+        dispatcher (Dispatcher): Dispatcher handling the updates
+        run_async (bool): Run the handlers in the pool of dispatcher workers
+        shard (int): Index of the process, to serve its metrics in its own port
+    """
+
+    from reminderbot.metrics import (
+        instrument_engine,
+        instrument_handler,
+        start_metrics_server,
+    )
+    from reminderbot.profiling import instrument_slow_queries
+    from reminderbot.utils import load_chat_filter
+    from reminderbot import HANDLERS
+
+    logger = logging.getLogger("INIT")
+    database = get_database()
+    if database.enabled:
+        load_chat_filter()
+
+        # The plans are only captured while developing, they repeat the query
+        instrument_slow_queries(
+            database.engine, get_slow_query_threshold(), get_debug_enabled()
+        )
+
+    #   Export metrics
+    metrics_enabled, metrics_listen, metrics_port = get_metrics_options()
+    if metrics_enabled:
+        metrics_port += shard
+        if database.enabled:
+            instrument_engine(database.engine)
+        start_metrics_server(metrics_listen, metrics_port)
+        logger.info(f"Metrics on {metrics_listen}:{metrics_port}/metrics")
 
     #   ADD Handlers
     debug_enabled = get_debug_enabled()
     logger.debug(f"Debug enabled: {debug_enabled}")
     for handler in HANDLERS:
+        if metrics_enabled:
+            instrument_handler(handler)
         if debug_enabled and hasattr(handler, "command"):
             handler.command = [c + "_test" for c in handler.command]
-        updater.dispatcher.add_handler(handler)
+        # Each update is handled by one of the (bounded) dispatcher workers
+        # so a slow query or API call doesn't block the rest of chats.
+        # python-telegram-bot 13 calls the handlers synchronously and its
+        # Bot API calls block, so they can't await the database either
+        handler.run_async = run_async
+        dispatcher.add_handler(handler)
 
-    #   Listen till end
-    logger.info("ReminderBot has started!")
-    try:
-        updater.start_polling()
-        updater.idle()
-    finally:
+
+def listen(updater: Updater, webhook: bool) -> None:
+    """
+    Receive the updates until the bot is stopped
+
+    Args:
+        updater (Updater): Updater of the bot
+        webhook (bool): Use a webhook instead of polling
+    """
+
+    logger = logging.getLogger("INIT")
+    if webhook:
+        webhook_options = get_webhook_options()
         logger.info(
-            "Shutting down\nBot is going to sleep (...)\nNo more reminders today (...)\nZzz"
+            f"Listening on {webhook_options['listen']}:{webhook_options['port']}"
+            f"/{webhook_options['url_path']}"
         )
+        updater.start_webhook(**webhook_options)
+    else:
+        updater.start_polling()
+    updater.idle()
 
 
 # Main Process
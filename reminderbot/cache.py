@@ -0,0 +1,149 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: In-process caches
+###############################################################################
+from __future__ import annotations
+from collections import OrderedDict
+from hashlib import blake2b
+from math import log
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable, Iterator, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Bounded cache with a time-to-live per entry and least-recently-used eviction.
+
+    It is shared between the dispatcher workers so every operation is
+    protected with a lock.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        """
+        Args:
+            max_size (int): Maximum amount of entries to keep
+            ttl (float): Seconds before an entry expires
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get the value cached for `key`
+
+        Args:
+            key (Hashable): Key of the entry
+
+        Returns:
+            Optional[Any]: Cached value or `None` if missing or expired
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Cache `value` for `key`, evicting the least recently used entry if full
+
+        Args:
+            key (Hashable): Key of the entry
+            value (Any): Value to cache
+            ttl (Optional[float]): Seconds before it expires. Defaults to the cache TTL
+        """
+
+        expires_at = monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Invalidate the entry for `key` if there is one
+
+        Args:
+            key (Hashable): Key of the entry
+        """
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Usage counters of the cache
+
+        Returns:
+            Dict[str, int]: hits, misses and current size
+        """
+
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set.
+
+    `in` never gives false negatives for added values, but it may give
+    false positives at (about) the configured rate while under capacity.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        """
+        Args:
+            capacity (int): Amount of values expected to be added
+            error_rate (float): Target false positive rate
+        """
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * log(error_rate) / (log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * log(2))), 1)
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = Lock()
+
+    def _positions(self, value: Hashable) -> Iterator[int]:
+        digest = blake2b(repr(value).encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value: Hashable) -> None:
+        with self._lock:
+            for position in self._positions(value):
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: Hashable) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
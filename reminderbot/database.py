@@ -2,28 +2,101 @@
 # Project: Mort de Gana Bot
 # Authors:
 # - Ytturi
-# Descr: PostgreSQL database connection
+# Descr: Database connection (PostgreSQL or SQLite)
 ###############################################################################
 from __future__ import annotations
-from typing import Optional
+from threading import Lock, RLock
+from time import perf_counter
+from typing import Any, Dict, Optional
 from sqlalchemy.engine import create_engine, Engine
-from sqlalchemy import Table, Column, MetaData
+from sqlalchemy import Table, Column, Computed, Index, MetaData, inspect
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.pool import QueuePool, StaticPool
 from sqlalchemy.sql.schema import UniqueConstraint
 from sqlalchemy.sql.sqltypes import Integer
 from sqlalchemy.types import BigInteger, DateTime, Text
 
+# The 'simple' configuration doesn't stem, the events are in several languages
+REMINDER_SEARCH_DOCUMENT = "to_tsvector('simple', title || ' ' || text)"
+
+
+class TimedQueuePool(QueuePool):
+    """
+    Connection pool that keeps track of the time spent waiting for a connection
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._stats_lock = Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_wait_total += wait
+                self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def recreate(self) -> TimedQueuePool:
+        # Keep the stats when the pool is replaced (e.g. `Engine.dispose`)
+        pool = super().recreate()
+        pool.checkouts = self.checkouts
+        pool.checkout_wait_total = self.checkout_wait_total
+        pool.checkout_wait_max = self.checkout_wait_max
+        return pool
+
+
+class SerializedStaticPool(StaticPool):
+    """
+    Single connection shared between threads, used by one thread at a time
+
+    SQLite connections aren't safe to use from several threads at once.
+    The lock is reentrant so a thread can run queries while it iterates
+    the results of another one.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._connection_lock = RLock()
+
+    def _do_get(self):
+        self._connection_lock.acquire()
+        try:
+            return super()._do_get()
+        except BaseException:
+            self._connection_lock.release()
+            raise
+
+    def _do_return_conn(self, conn) -> None:
+        try:
+            super()._do_return_conn(conn)
+        finally:
+            self._connection_lock.release()
+
 
 class Database:
-    def __init__(self, psql_connection: Optional[str]) -> None:
+    def __init__(
+        self,
+        connection_uri: Optional[str],
+        engine_options: Optional[Dict[str, Any]] = None,
+    ) -> None:
         """
         Initialize the local variables according to the conf
         """
-        self.psql_connection = psql_connection
+        self.connection_uri = connection_uri
+        self.engine_options = engine_options or {}
 
         # Init engine and tables as None for lazy-load
         self._engine = None
         self._chat_table = None
         self._reminder_table = None
+        self._schema_version_table = None
 
     def __del__(self) -> None:
         """
@@ -41,17 +114,29 @@ class Database:
             bool: True if there is a connection, False otherwise
         """
 
-        return True if self.psql_connection else False
+        return True if self.connection_uri else False
+
+    @property
+    def is_sqlite(self) -> bool:
+        """Return wether the database is a SQLite file or in-memory database
+
+        Returns:
+            bool: True if it's SQLite, False otherwise (PostgreSQL)
+        """
+
+        return self.connection_uri is not None and self.connection_uri.startswith(
+            "sqlite"
+        )
 
     @property
     def engine(self) -> Engine:
-        """Return the database engine with the psql connection from the confs.
+        """Return the database engine with the connection from the confs.
 
         The engine will be created if it hasn't been created yet
         and will be cached.
 
         Returns:
-            Engine: Engine connection to the psql database
+            Engine: Engine connection to the database
         """
         if self._engine is not None:
             return self._engine
@@ -61,9 +146,66 @@ class Database:
                 "Trying to retrieve the database engine but there is no connection"
             )
 
-        self._engine = create_engine(self.psql_connection)
+        if self.is_sqlite:
+            self._engine = self._create_sqlite_engine()
+        else:
+            self._engine = create_engine(
+                self.connection_uri, poolclass=TimedQueuePool, **self.engine_options
+            )
         return self._engine
 
+    def _create_sqlite_engine(self) -> Engine:
+        """
+        Create the engine for a SQLite database.
+
+        The connection is shared between the dispatcher workers,
+        and an in-memory database lives as long as its single connection,
+        which the threads take in turns.
+        """
+
+        connect_args = {"check_same_thread": False}
+        if self.connection_uri in ("sqlite://", "sqlite:///:memory:"):
+            return create_engine(
+                self.connection_uri,
+                connect_args=connect_args,
+                poolclass=SerializedStaticPool,
+            )
+
+        return create_engine(self.connection_uri, connect_args=connect_args)
+
+    @property
+    def pool_stats(self) -> Dict[str, Any]:
+        """Return the usage of the connection pool
+
+        Returns:
+            Dict[str, Any]: Connections in the pool, checked out and in overflow
+                and the amount of checkouts with their waiting time (seconds)
+        """
+
+        if self._engine is None:
+            return {}
+
+        pool = self._engine.pool
+        if not isinstance(pool, QueuePool):
+            return {}
+
+        stats: Dict[str, Any] = {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+        if isinstance(pool, TimedQueuePool):
+            stats.update(
+                {
+                    "checkouts": pool.checkouts,
+                    "checkout_wait_total": pool.checkout_wait_total,
+                    "checkout_wait_max": pool.checkout_wait_max,
+                }
+            )
+
+        return stats
+
     @property
     def reminder(self) -> Table:
         """
@@ -84,17 +226,29 @@ class Database:
         """
 
         metadata = MetaData(self.engine)
+        search_columns = []
+        if not self.is_sqlite:
+            # Kept up to date by postgres, for /search
+            search_columns = [
+                Column("search", TSVECTOR, Computed(REMINDER_SEARCH_DOCUMENT)),
+                Index("reminder_search_idx", "search", postgresql_using="gin"),
+            ]
+
         self._reminder_table = Table(
             "reminder",
             metadata,
             Column("id", Integer, primary_key=True, index=True),
-            Column("chat_id", Integer, index=True, nullable=False),
+            Column("chat_id", Integer, nullable=False),
             Column("title", Text, nullable=False),
             Column("date", DateTime, nullable=False),
             Column("text", Text, nullable=False),
+            # Rule of reminderbot.recurrence, `date` is the first occurrence
+            Column("recurrence", Text, nullable=True),
             UniqueConstraint(
                 "chat_id", "title", "date", name="reminder_chat_title_date_unique"
             ),
+            Index("reminder_chat_id_date_idx", "chat_id", "date", "id"),
+            *search_columns,
         )
 
         if init:
@@ -126,6 +280,39 @@ class Database:
             Column("id", Integer, primary_key=True, index=True),
             Column("chat_id", BigInteger, index=True, nullable=False),
             Column("name", Text, nullable=False),
+            # IANA time zone the dates of the chat are written and shown in
+            Column("timezone", Text, nullable=False, server_default="UTC"),
+        )
+
+        if init:
+            metadata.create_all()
+
+    @property
+    def schema_version(self) -> Table:
+        """
+        Get the `schema_version` table definition.
+
+        Returns:
+            Table: `schema_version` table definition
+        """
+
+        if self._schema_version_table is None:
+            self._build_schema_version_table()
+
+        return self._schema_version_table
+
+    def _build_schema_version_table(self, init: bool = False) -> None:
+        """
+        Create the Table with the connection metadata
+        """
+
+        metadata = MetaData(self.engine)
+        self._schema_version_table = Table(
+            "schema_version",
+            metadata,
+            Column("version", Integer, primary_key=True),
+            Column("description", Text, nullable=False),
+            Column("applied_at", DateTime, nullable=False),
         )
 
         if init:
@@ -135,13 +322,36 @@ class Database:
         """
         Create all the database Tables
 
-        Warning: This method does not update existing tables
+        New tables are created with the latest schema,
+        so every migration is recorded as applied.
+
+        Warning: This method does not update existing tables, use `migrate`
         """
+        from reminderbot.migrations import stamp_database
 
         if self.enabled is False:
             raise Exception(
                 "Trying to initialize the database without database connection"
             )
 
+        new_database = not inspect(self.engine).has_table("reminder")
+
         self._build_reminder_table(init=True)
         self._build_chat_table(init=True)
+        self._build_schema_version_table(init=True)
+        if new_database:
+            stamp_database(self)
+
+    def migrate(self) -> None:
+        """
+        Apply the pending migrations to update existing tables
+        """
+        from reminderbot.migrations import migrate_database
+
+        if self.enabled is False:
+            raise Exception(
+                "Trying to migrate the database without database connection"
+            )
+
+        self._build_schema_version_table(init=True)
+        migrate_database(self)
@@ -0,0 +1,161 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Parsing of the dates of the events
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Optional
+from zoneinfo import ZoneInfo
+import re
+
+# The dates are stored as naive datetimes in UTC,
+# converted from and to the time zone of the chat when parsed and rendered.
+# The fixed UTC doesn't need the time zone database (tzdata) to be imported
+UTC = timezone.utc
+
+# The formats are matched in this order, the first one is the documented one:
+# - dd-mm-yyyy HH:MM (also with "/" or "." between the date parts)
+# - yyyy-mm-dd HH:MM (also with a "T" between the date and the time)
+# - today HH:MM / tomorrow HH:MM
+# - in 2h / in 30m / in 3d / in 1w (or combined: in 1h 30m)
+DAY_FIRST_RE = re.compile(
+    r"(\d{1,2})([-/.])(\d{1,2})\2(\d{4})\s+(\d{1,2}):(\d{1,2})", re.ASCII
+)
+YEAR_FIRST_RE = re.compile(
+    r"(\d{4})-(\d{1,2})-(\d{1,2})(?:\s+|T)(\d{1,2}):(\d{1,2})", re.ASCII
+)
+DAY_NAME_RE = re.compile(
+    r"(today|tomorrow)\s+(\d{1,2}):(\d{1,2})", re.ASCII | re.IGNORECASE
+)
+RELATIVE_RE = re.compile(
+    r"in((?:\s*\d+\s*(?:w|weeks?|d|days?|h|hours?|m|mins?|minutes?))+)",
+    re.ASCII | re.IGNORECASE,
+)
+RELATIVE_PART_RE = re.compile(r"(\d+)\s*([a-z])[a-z]*", re.ASCII | re.IGNORECASE)
+
+# Keyword of `timedelta` for the first letter of each unit
+RELATIVE_UNITS = {"w": "weeks", "d": "days", "h": "hours", "m": "minutes"}
+
+
+def utc_now() -> datetime:
+    """
+    Get the current time as stored in the database
+
+    Returns:
+        datetime: Current time in UTC (naive)
+    """
+
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def get_timezone(name: Optional[str]) -> tzinfo:
+    """
+    Get the time zone of a chat
+
+    Args:
+        name (Optional[str]): IANA name of the time zone (e.g. Europe/Madrid)
+
+    Returns:
+        tzinfo: The time zone, UTC without a name
+
+    Raises:
+        ValueError: If it isn't a known time zone
+    """
+
+    if not name:
+        return UTC
+
+    try:
+        return ZoneInfo(name)
+    except (KeyError, ValueError):
+        raise ValueError(f"Unknown time zone: {name!r}")
+
+
+def to_utc(date: datetime, timezone: tzinfo) -> datetime:
+    """
+    Convert a local time to the stored time
+
+    Args:
+        date (datetime): Naive time in `timezone`
+        timezone (tzinfo): Time zone of the chat
+
+    Returns:
+        datetime: Naive time in UTC
+    """
+
+    return date.replace(tzinfo=timezone).astimezone(UTC).replace(tzinfo=None)
+
+
+def from_utc(date: datetime, timezone: tzinfo) -> datetime:
+    """
+    Convert a stored time to a local time
+
+    Args:
+        date (datetime): Naive time in UTC
+        timezone (tzinfo): Time zone of the chat
+
+    Returns:
+        datetime: Naive time in `timezone`
+    """
+
+    return date.replace(tzinfo=UTC).astimezone(timezone).replace(tzinfo=None)
+
+
+def parse_date(date_str: str, now: Optional[datetime] = None) -> datetime:
+    """
+    Parse the date of an event, absolute or relative to now.
+
+    The formats are regular expressions compiled once, a lot cheaper than
+    `datetime.strptime` which looks up the format in its cache and the locale
+    on every call (and once per format when several are tried).
+
+    Args:
+        date_str (str): Date as written by the user
+        now (Optional[datetime]): Current (local) time for the relative dates,
+            defaults to `datetime.now()`
+
+    Returns:
+        datetime: Time of the event, to the minute
+
+    Raises:
+        ValueError: If it doesn't match any format or isn't a valid date
+    """
+
+    date_str = date_str.strip()
+
+    match = DAY_FIRST_RE.fullmatch(date_str)
+    if match is not None:
+        day, _separator, month, year, hour, minute = match.groups()
+        return datetime(int(year), int(month), int(day), int(hour), int(minute))
+
+    match = YEAR_FIRST_RE.fullmatch(date_str)
+    if match is not None:
+        year, month, day, hour, minute = match.groups()
+        return datetime(int(year), int(month), int(day), int(hour), int(minute))
+
+    if now is None:
+        now = datetime.now()
+
+    match = DAY_NAME_RE.fullmatch(date_str)
+    if match is not None:
+        day_name, hour, minute = match.groups()
+        date = now.date()
+        if day_name.lower() == "tomorrow":
+            date += timedelta(days=1)
+        return datetime(date.year, date.month, date.day, int(hour), int(minute))
+
+    match = RELATIVE_RE.fullmatch(date_str)
+    if match is not None:
+        try:
+            delta = timedelta()
+            for amount, unit in RELATIVE_PART_RE.findall(match.group(1)):
+                delta += timedelta(**{RELATIVE_UNITS[unit.lower()]: int(amount)})
+            return now.replace(second=0, microsecond=0) + delta
+        except OverflowError:
+            # Past the last date datetime can represent (year 9999)
+            raise ValueError(f"Unknown date format: {date_str!r}")
+
+    raise ValueError(f"Unknown date format: {date_str!r}")
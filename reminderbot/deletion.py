@@ -0,0 +1,164 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Background deletion of the command messages
+###############################################################################
+from __future__ import annotations
+from collections import Counter
+from heapq import heappop, heappush
+from itertools import count
+from logging import getLogger
+from threading import Condition, Thread
+from time import monotonic
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from telegram.error import BadRequest, RetryAfter, Unauthorized
+
+from reminderbot.metrics import API_LATENCY
+
+if TYPE_CHECKING:
+    from telegram import Bot
+
+
+logger = getLogger(__name__)
+
+_deletion_queue = None
+
+
+class DeletionQueue:
+    """
+    Delete messages from a background thread.
+
+    Pending deletions are processed in batches. Transient failures (network,
+    flood control) are retried with exponential backoff, while permanent ones
+    (already deleted, no permissions) are dropped after the first attempt.
+    """
+
+    def __init__(
+        self, batch_size: int = 20, max_attempts: int = 5, backoff: float = 1.0
+    ) -> None:
+        """
+        Args:
+            batch_size (int): Maximum deletions processed per wake up
+            max_attempts (int): Attempts before giving up on a deletion
+            backoff (float): Seconds before the first retry, doubled on each one
+        """
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+
+        # (not before, order, attempt, bot, chat_id, message_id)
+        self._pending: List[Tuple[float, int, int, Bot, int, int]] = []
+        self._order = count()
+        self._condition = Condition()
+        self._outcomes: Counter = Counter()
+        self._thread: Optional[Thread] = None
+
+    def push(self, bot: Bot, chat_id: int, message_id: int) -> None:
+        """
+        Queue the deletion of a message
+
+        Args:
+            bot (Bot): Telegram bot deleting the message
+            chat_id (int): Telegram chat of the message
+            message_id (int): ID of the message in the chat
+        """
+
+        with self._condition:
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="DeletionQueue", daemon=True
+                )
+                self._thread.start()
+
+            self._schedule(monotonic(), 1, bot, chat_id, message_id)
+            self._condition.notify()
+
+    def _schedule(
+        self, not_before: float, attempt: int, bot: Bot, chat_id: int, message_id: int
+    ) -> None:
+        heappush(
+            self._pending,
+            (not_before, next(self._order), attempt, bot, chat_id, message_id),
+        )
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Outcome counters of the deletions
+
+        Returns:
+            Dict[str, int]: deleted, retried, dropped (permanent failure),
+                failed (too many attempts) and pending deletions
+        """
+
+        with self._condition:
+            return {**self._outcomes, "pending": len(self._pending)}
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending or self._pending[0][0] > monotonic():
+                    timeout = (
+                        self._pending[0][0] - monotonic() if self._pending else None
+                    )
+                    self._condition.wait(timeout)
+
+                batch: List[Tuple[float, int, int, Bot, int, int]] = []
+                while (
+                    self._pending
+                    and self._pending[0][0] <= monotonic()
+                    and len(batch) < self.batch_size
+                ):
+                    batch.append(heappop(self._pending))
+
+            for _not_before, _order, attempt, bot, chat_id, message_id in batch:
+                self._delete(attempt, bot, chat_id, message_id)
+
+    def _delete(self, attempt: int, bot: Bot, chat_id: int, message_id: int) -> None:
+        try:
+            with API_LATENCY.time("delete_message"):
+                bot.delete_message(chat_id=chat_id, message_id=message_id)
+            outcome = "deleted"
+
+        except (BadRequest, Unauthorized) as err:
+            # Already deleted or no permissions, it won't change retrying
+            logger.debug(f"Could not delete {chat_id}/{message_id}: {err}")
+            outcome = "dropped"
+
+        except Exception as err:
+            if attempt >= self.max_attempts:
+                logger.warning(f"Gave up deleting {chat_id}/{message_id}: {err}")
+                outcome = "failed"
+
+            else:
+                if isinstance(err, RetryAfter):
+                    delay = float(err.retry_after)
+                else:
+                    delay = self.backoff * 2 ** (attempt - 1)
+
+                with self._condition:
+                    self._schedule(
+                        monotonic() + delay, attempt + 1, bot, chat_id, message_id
+                    )
+                outcome = "retried"
+
+        with self._condition:
+            self._outcomes[outcome] += 1
+
+
+def get_deletion_queue() -> DeletionQueue:
+    """
+    Get the deletion queue of the bot or create it
+
+    Returns:
+        DeletionQueue: Queue of messages to delete
+    """
+
+    global _deletion_queue
+    if _deletion_queue is None:
+        _deletion_queue = DeletionQueue()
+
+    return _deletion_queue
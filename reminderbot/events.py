@@ -1,18 +1,35 @@
 from __future__ import annotations
-from datetime import datetime
+from concurrent.futures import Future
+from datetime import datetime, timedelta, tzinfo
 from enum import Enum
-from reminderbot.conf import get_database
-from typing import Any, Dict, Iterator, Tuple, TYPE_CHECKING
+from heapq import merge
+from itertools import count, islice
+from reminderbot.conf import get_database, get_reply_cache_options
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
 from logging import getLogger
 
-from sqlalchemy import select, desc, asc
+from sqlalchemy import and_, or_, select, desc, asc, func
 from telegram.ext import CommandHandler
 
+from reminderbot.cache import LRUCache
+from reminderbot.dates import get_timezone, utc_now
+from reminderbot.outbox import get_outbox, reply_markdown_v2, reply_text
+from reminderbot.recurrence import (
+    RECURRENCE_HORIZON,
+    iter_event_occurrences,
+    next_occurrence,
+)
+from reminderbot.render import (
+    render_event,
+    render_event_line,
+    render_list_header,
+    render_search_header,
+)
 from reminderbot.utils import (
     remove_command_message,
     send_typing_action,
+    get_chat_timezone,
     get_enabled_chat,
-    escape_for_markdown_v2
 )
 
 if TYPE_CHECKING:
@@ -21,6 +38,18 @@ if TYPE_CHECKING:
 
 logger = getLogger(__name__)
 
+# Telegram rejects longer messages
+MESSAGE_MAX_LENGTH = 4096
+# Events fetched per query when listing all of them
+LIST_PAGE_SIZE = 100
+# Best matches shown by /search
+SEARCH_LIMIT = 10
+
+_reply_cache = None
+# Replies are cached by chat generation, which changes on every write
+_chat_generations: Dict[int, int] = {}
+_generation_counter = count(1)
+
 
 class DateFilter(Enum):
     no_filter = "NoFilter"
@@ -41,11 +70,12 @@ def next_event(update: Update, context) -> None:
     chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
     if chat_id is None:
         update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
-        update.message.reply_text(update_message)
+        reply_text(update.message, update_message)
         return
 
-    update.message.reply_markdown_v2(
-        generate_list_events(chat_id, 5, DateFilter.future)
+    timezone = get_chat_timezone(telegram_chat_id)
+    reply_markdown_v2(
+        update.message, generate_list_events(chat_id, 5, DateFilter.future, timezone)
     )
 
 
@@ -62,11 +92,12 @@ def last_event(update: Update, context) -> None:
     chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
     if chat_id is None:
         update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
-        update.message.reply_text(update_message)
+        reply_text(update.message, update_message)
         return
 
-    update.message.reply_text(
-        generate_list_events(chat_id, 5, DateFilter.past), parse_mode="markdown"
+    timezone = get_chat_timezone(telegram_chat_id)
+    reply_markdown_v2(
+        update.message, generate_list_events(chat_id, 5, DateFilter.past, timezone)
     )
 
 
@@ -96,16 +127,47 @@ def list_events(update: Update, context) -> None:
     chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
     if chat_id is None:
         update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
-        update.message.reply_text(update_message)
+        reply_text(update.message, update_message)
         return
 
     # Remove the first 6 characters: "/list "
     message_text = update.message.text[6:].strip()
     amount, date_filter = parse_list_arguments(message_text)
 
-    update.message.reply_markdown_v2(
-        generate_list_events(chat_id, amount, date_filter)
-    )
+    timezone = get_chat_timezone(update.message.chat.id)
+    for list_message in get_list_messages(chat_id, amount, date_filter, timezone):
+        reply_markdown_v2(update.message, list_message)
+
+
+@send_typing_action
+def search_events(update: Update, context) -> None:
+    """
+    Show the events whose title or description match some terms.
+    Format:
+    /search <terms>
+    """
+    logger.info("Handle 'search'")
+
+    telegram_chat_id = update.message.chat.id
+    telegram_chat_name = update.message.chat.title
+
+    chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
+    if chat_id is None:
+        update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
+        reply_text(update.message, update_message)
+        return
+
+    # Remove the first 8 characters: "/search "
+    terms = update.message.text[8:].strip()
+    if not terms:
+        reply_text(update.message, "Should have the format: '/search <terms>'")
+        return
+
+    events = search_events_db(chat_id=chat_id, terms=terms)
+    header = render_search_header(len(events), terms)
+    timezone = get_chat_timezone(telegram_chat_id)
+    for search_message in render_messages(header, events, timezone):
+        reply_markdown_v2(update.message, search_message)
 
 
 def parse_list_arguments(message: str) -> Tuple[int, DateFilter]:
@@ -171,7 +233,57 @@ def parse_list_amount(amount_str: str) -> int:
         return abs(int(amount_str))
 
 
-def generate_list_events(chat_id: int, amount: int, date_filter: DateFilter) -> str:
+def get_reply_cache() -> LRUCache:
+    """
+    Get the cache of rendered replies or create it with the sizes from the confs
+
+    Returns:
+        LRUCache: Cache of rendered replies
+    """
+
+    global _reply_cache
+    if _reply_cache is None:
+        size, ttl = get_reply_cache_options()
+        _reply_cache = LRUCache(max_size=size, ttl=ttl)
+
+    return _reply_cache
+
+
+def invalidate_chat_replies(chat_id: int) -> None:
+    """
+    Discard the cached replies of a chat after its events change
+
+    Args:
+        chat_id (int): ID of the database chat
+    """
+
+    _chat_generations[chat_id] = next(_generation_counter)
+
+
+def get_reply_ttl(boundary: Optional[datetime]) -> float:
+    """
+    Get the time-to-live for a cached reply that changes at `boundary`
+
+    Args:
+        boundary (Optional[datetime]): When the reply becomes outdated, if known
+
+    Returns:
+        float: Seconds to keep the reply cached
+    """
+
+    ttl = get_reply_cache().ttl
+    if boundary is None:
+        return ttl
+
+    return max(min(ttl, (boundary - utc_now()).total_seconds()), 0)
+
+
+def generate_list_events(
+    chat_id: int,
+    amount: int,
+    date_filter: DateFilter,
+    timezone: Optional[tzinfo] = None,
+) -> str:
     """
     List the existing events for the current chat
 
@@ -179,36 +291,176 @@ def generate_list_events(chat_id: int, amount: int, date_filter: DateFilter) ->
         chat_id (int): Chat requesting the list of events
         amount (int): Amount of events to retrieve (0=all)
         date_filter (DateFilter): Filter for the date
+        timezone (Optional[tzinfo]): Time zone of the chat
 
     Returns:
         str: Message to reply
     """
 
-    amount_str = (str(amount) if amount else "All") + " "
-    date_str = (date_filter.value + " ") if date_filter != DateFilter.no_filter else ""
-    event_texts = [f"*{amount_str}{date_str}events:*\n"]
+    return "\n".join(get_list_messages(chat_id, amount, date_filter, timezone))
 
-    events = list_events_db(chat_id=chat_id, amount=amount, date_filter=date_filter)
-    for event in events:
-        event_texts.append(
-            f"-\[{event['date']}\] *{event['title']}* _\<{event['id']}\>_"
-        )
 
-    return escape_for_markdown_v2("\n".join(event_texts))
+def get_list_messages(
+    chat_id: int,
+    amount: int,
+    date_filter: DateFilter,
+    timezone: Optional[tzinfo] = None,
+) -> Iterable[str]:
+    """
+    List the existing events for the current chat from the reply cache.
+
+    Only lists up to `LIST_PAGE_SIZE` events are cached, the longer ones
+    are streamed from the database.
+
+    Args:
+        chat_id (int): Chat requesting the list of events
+        amount (int): Amount of events to retrieve (0=all)
+        date_filter (DateFilter): Filter for the date
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        Iterable[str]: Messages to reply
+    """
+
+    if not amount or amount > LIST_PAGE_SIZE:
+        return generate_list_messages(chat_id, amount, date_filter, timezone)
+
+    cache = get_reply_cache()
+    key = ("list", chat_id, _chat_generations.get(chat_id), amount, date_filter)
+    list_messages = cache.get(key)
+    if list_messages is not None:
+        return list_messages
+
+    events = list(
+        list_events_db(chat_id=chat_id, amount=amount, date_filter=date_filter)
+    )
+    list_messages = list(render_list_messages(amount, date_filter, events, timezone))
+
+    # The list changes when the next event happens
+    boundary = None
+    if date_filter == DateFilter.future and events:
+        boundary = events[0]["date"]
+    elif date_filter == DateFilter.past:
+        next_event_data = get_event_data(chat_id=chat_id, event_id=None)
+        if next_event_data is not None:
+            boundary = next_event_data["date"]
+
+    cache.set(key, list_messages, ttl=get_reply_ttl(boundary))
+    return list_messages
+
+
+def generate_list_messages(
+    chat_id: int,
+    amount: int,
+    date_filter: DateFilter,
+    timezone: Optional[tzinfo] = None,
+) -> Iterator[str]:
+    """
+    List the existing events for the current chat split in messages
+    that fit in a telegram message.
+
+    The events are rendered as they are read, so listing all the events
+    doesn't load all of them at once.
+
+    Args:
+        chat_id (int): Chat requesting the list of events
+        amount (int): Amount of events to retrieve (0=all)
+        date_filter (DateFilter): Filter for the date
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        Iterator[str]: Messages to reply
+    """
+
+    if amount:
+        events = list_events_db(chat_id=chat_id, amount=amount, date_filter=date_filter)
+    else:
+        events = iter_events_db(chat_id=chat_id, date_filter=date_filter)
+
+    return render_list_messages(amount, date_filter, events, timezone)
+
+
+def render_list_messages(
+    amount: int,
+    date_filter: DateFilter,
+    events: Iterable[Dict[str, Any]],
+    timezone: Optional[tzinfo] = None,
+) -> Iterator[str]:
+    """
+    Render a list of events split in messages that fit in a telegram message
+
+    Args:
+        amount (int): Amount of events requested (0=all)
+        date_filter (DateFilter): Filter for the date
+        events (Iterable[Dict[str, Any]]): Events to render
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        Iterator[str]: Messages to reply
+    """
+
+    date_filter_name = date_filter.value if date_filter != DateFilter.no_filter else ""
+    header = render_list_header(amount, date_filter_name)
+    return render_messages(header, events, timezone)
+
+
+def render_messages(
+    header: str,
+    events: Iterable[Dict[str, Any]],
+    timezone: Optional[tzinfo] = None,
+) -> Iterator[str]:
+    """
+    Render the lines of some events split in messages that fit in a telegram message
+
+    Args:
+        header (str): Header of the first message
+        events (Iterable[Dict[str, Any]]): Events to render
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Yields:
+        str: Message to reply
+    """
+
+    message_lines = [header]
+    message_length = len(header)
+    for index, event in enumerate(events):
+        # Longer lines are truncated, the first one to fit with the header
+        # so it's never sent alone
+        max_length = MESSAGE_MAX_LENGTH
+        if index == 0:
+            max_length -= message_length + 1
+        event_line = render_event_line(event, timezone, max_length)
+        # +1 for the line break joining it
+        if message_length + len(event_line) + 1 > MESSAGE_MAX_LENGTH:
+            yield "\n".join(message_lines)
+            message_lines = []
+            message_length = -1
+
+        message_lines.append(event_line)
+        message_length += len(event_line) + 1
+
+    yield "\n".join(message_lines)
 
 
 def list_events_db(
-    chat_id: int, amount: int, date_filter: DateFilter
+    chat_id: int,
+    amount: int,
+    date_filter: DateFilter,
+    after: Optional[Tuple[datetime, int]] = None,
 ) -> Iterator[Dict[str, Any]]:
     """
     Query the database to retrieve the list of events of a singular chat.
 
-    Returns the events as a generator.
+    Returns the events as a generator. The occurrences of the recurring events
+    are generated as they are merged, by date, with the one-off events; without
+    an amount the future ones stop `RECURRENCE_HORIZON` after the first one.
 
     Args:
         chat_id (int): Chat requesting the list of events
         amount (int): Amount of events to retrieve (0=all)
         date_filter (DateFilter): Filter for the date
+        after (Optional[Tuple[datetime, int]]): `(date, id)` of the last event
+            of the previous page, to get the events that follow it
 
     Yields:
         Dict[str, Any]: Event from the database
@@ -216,32 +468,244 @@ def list_events_db(
     from reminderbot.conf import get_database
 
     database = get_database()
+    reminder = database.reminder
 
-    select_query = select(
-        [database.reminder.c.id, database.reminder.c.date, database.reminder.c.title]
-    ).where(database.reminder.c.chat_id == chat_id)
+    select_query = select([reminder.c.id, reminder.c.date, reminder.c.title]).where(
+        and_(reminder.c.chat_id == chat_id, reminder.c.recurrence.is_(None))
+    )
 
     if amount:
         select_query = select_query.limit(amount)
 
+    current_date = utc_now()
     if date_filter != DateFilter.no_filter:
-        current_date = datetime.now()
-
         if date_filter == DateFilter.past:
-            select_query = select_query.where(database.reminder.c.date < current_date)
+            select_query = select_query.where(reminder.c.date < current_date)
 
         else:
-            select_query = select_query.where(database.reminder.c.date > current_date)
+            select_query = select_query.where(reminder.c.date > current_date)
+
+    ascending = date_filter == DateFilter.future
+    if after is not None:
+        after_date, after_id = after
+        if ascending:
+            select_query = select_query.where(
+                or_(
+                    reminder.c.date > after_date,
+                    and_(reminder.c.date == after_date, reminder.c.id > after_id),
+                )
+            )
+        else:
+            select_query = select_query.where(
+                or_(
+                    reminder.c.date < after_date,
+                    and_(reminder.c.date == after_date, reminder.c.id < after_id),
+                )
+            )
 
-    if date_filter == DateFilter.future:
-        select_query.order_by(asc(database.reminder.c.date))
+    if ascending:
+        select_query = select_query.order_by(asc(reminder.c.date), asc(reminder.c.id))
 
     else:
-        select_query.order_by(desc(database.reminder.c.date))
+        select_query = select_query.order_by(desc(reminder.c.date), desc(reminder.c.id))
 
+    select_query = select_query.execution_options(profile_name="list_events_db")
     results = database.engine.execute(select_query)
+    events = ({**row} for row in results)
+
+    before = current_date if date_filter == DateFilter.past else None
+    recurring_events = get_recurring_events_db(chat_id=chat_id, before=before)
+    if not recurring_events:
+        return events
+
+    occurrences = [
+        iter_listed_occurrences(event, date_filter, current_date, after, amount)
+        for event in recurring_events
+    ]
+    events = merge(
+        events,
+        *occurrences,
+        key=lambda event: (event["date"], event["id"]),
+        reverse=not ascending,
+    )
+    return islice(events, amount) if amount else events
+
+
+def iter_listed_occurrences(
+    event: Dict[str, Any],
+    date_filter: DateFilter,
+    current_date: datetime,
+    after: Optional[Tuple[datetime, int]] = None,
+    amount: int = 0,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generate the occurrences of a recurring event in the order of a list
+
+    Args:
+        event (Dict[str, Any]): Recurring event from the database
+        date_filter (DateFilter): Filter for the date
+        current_date (datetime): Date the list is filtered with
+        after (Optional[Tuple[datetime, int]]): `(date, id)` of the last event
+            of the previous page, to get the events that follow it
+        amount (int): Amount of events listed (0=all), the ascending
+            occurrences of a bounded list are only limited by it
+
+    Yields:
+        Dict[str, Any]: Occurrence of the event
+    """
+
+    ascending = date_filter == DateFilter.future
+    if after is not None:
+        # The bounds are excluded, the occurrence on the date of the previous
+        # event is included if the event goes after it (by id)
+        after_date, after_id = after
+        if ascending and event["id"] > after_id:
+            after_date -= timedelta.resolution
+        elif not ascending and event["id"] < after_id:
+            after_date += timedelta.resolution
+
+    if date_filter == DateFilter.past:
+        before = current_date if after is None else min(current_date, after_date)
+        yield from iter_event_occurrences(event, before=before, reverse=True)
+        return
+
+    # Measured from the first occurrence listed, so an event starting later
+    # is still listed along with the one-off events of its dates
+    horizon = max(current_date, event["date"]) + RECURRENCE_HORIZON
+    if ascending:
+        start = current_date if after is None else max(current_date, after_date)
+        end = None if amount else horizon
+        yield from iter_event_occurrences(event, after=start, before=end)
+    else:
+        before = horizon if after is None else min(horizon, after_date)
+        yield from iter_event_occurrences(event, before=before, reverse=True)
+
+
+def get_recurring_events_db(
+    chat_id: int, before: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Query the recurring events of a chat, dated with their first occurrence
+
+    Args:
+        chat_id (int): Chat of the events
+        before (Optional[datetime]): Only the events that started before it
+
+    Returns:
+        List[Dict[str, Any]]: Events with their id, date, title, text,
+            recurrence and the timezone of the chat
+    """
+
+    database = get_database()
+    reminder = database.reminder
+    chat = database.chat
+
+    select_query = select(
+        [
+            reminder.c.id,
+            reminder.c.date,
+            reminder.c.title,
+            reminder.c.text,
+            reminder.c.recurrence,
+            chat.c.timezone,
+        ]
+    ).where(
+        and_(
+            reminder.c.chat_id == chat_id,
+            reminder.c.chat_id == chat.c.id,
+            reminder.c.recurrence.isnot(None),
+        )
+    )
+
+    if before is not None:
+        select_query = select_query.where(reminder.c.date < before)
+
+    select_query = select_query.execution_options(
+        profile_name="get_recurring_events_db"
+    )
+    return [{**row} for row in database.engine.execute(select_query)]
+
+
+def search_events_db(
+    chat_id: int, terms: str, limit: int = SEARCH_LIMIT
+) -> List[Dict[str, Any]]:
+    """
+    Query the database for the events of a chat matching the terms.
+
+    PostgreSQL uses the full-text index of the reminders, ranking the events
+    by relevance. SQLite looks for every term in the title or description
+    (case-insensitive for ASCII) and returns the latest events first.
+
+    Args:
+        chat_id (int): Chat searching the events
+        terms (str): Words to look for, as written by the user
+        limit (int): Maximum amount of events to return
+
+    Returns:
+        List[Dict[str, Any]]: Events with their id, date and title
+    """
+
+    database = get_database()
+    reminder = database.reminder
+
+    select_query = select([reminder.c.id, reminder.c.date, reminder.c.title]).where(
+        reminder.c.chat_id == chat_id
+    )
+
+    if database.is_sqlite:
+        for term in terms.split():
+            select_query = select_query.where(
+                or_(
+                    reminder.c.title.contains(term, autoescape=True),
+                    reminder.c.text.contains(term, autoescape=True),
+                )
+            )
+        select_query = select_query.order_by(desc(reminder.c.date))
+
+    else:
+        query = func.plainto_tsquery("simple", terms)
+        select_query = select_query.where(reminder.c.search.op("@@")(query)).order_by(
+            desc(func.ts_rank(reminder.c.search, query)), desc(reminder.c.date)
+        )
+
+    select_query = select_query.limit(limit).execution_options(
+        profile_name="search_events_db"
+    )
+    return [{**row} for row in database.engine.execute(select_query)]
 
-    return ({**row} for row in results)
+
+def iter_events_db(
+    chat_id: int, date_filter: DateFilter, page_size: int = LIST_PAGE_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Retrieve all the events of a singular chat, querying them by pages
+    (keyset pagination on `(date, id)`).
+
+    Args:
+        chat_id (int): Chat requesting the list of events
+        date_filter (DateFilter): Filter for the date
+        page_size (int): Amount of events to retrieve per query
+
+    Yields:
+        Dict[str, Any]: Event from the database
+    """
+
+    after = None
+    while True:
+        page = list(
+            list_events_db(
+                chat_id=chat_id,
+                amount=page_size,
+                date_filter=date_filter,
+                after=after,
+            )
+        )
+        yield from page
+
+        if len(page) < page_size:
+            return
+
+        after = (page[-1]["date"], page[-1]["id"])
 
 
 @send_typing_action
@@ -259,13 +723,27 @@ def pin_event(update: Update, context) -> None:
     chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
     if chat_id is None:
         update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
-        update.message.reply_text(update_message)
+        reply_text(update.message, update_message)
         return
 
-    event_message = get_event_message(chat_id=chat_id)
+    timezone = get_chat_timezone(telegram_chat_id)
+    event_message = get_event_message(chat_id=chat_id, timezone=timezone)
     if event_message:
-        sent_message = update.message.reply_markdown_v2(event_message)
-        sent_message.pin()
+        sent_message = reply_markdown_v2(update.message, event_message)
+        sent_message.add_done_callback(pin_sent_message)
+
+
+def pin_sent_message(sent_message: Future) -> None:
+    """
+    Pin a queued message once it's sent
+
+    Args:
+        sent_message (Future): Message being sent by the outbox
+    """
+
+    if sent_message.exception() is None:
+        message = sent_message.result()
+        get_outbox().send(message.chat_id, message.pin)
 
 
 @send_typing_action
@@ -283,20 +761,25 @@ def show_event(update: Update, context) -> None:
     chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
     if chat_id is None:
         update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
-        update.message.reply_text(update_message)
+        reply_text(update.message, update_message)
         return
 
     # Remove the first 6 characters: "/event"
     event_id = int(update.message.text[6:].strip())
-    event_message = get_event_message(chat_id=chat_id, event_id=event_id)
+    timezone = get_chat_timezone(telegram_chat_id)
+    event_message = get_event_message(
+        chat_id=chat_id, event_id=event_id, timezone=timezone
+    )
     if event_message:
-        update.message.reply_markdown_v2(event_message)
+        reply_markdown_v2(update.message, event_message)
     
     else:
-        update.message.reply_text("This event wasn't found. Try /list")
+        reply_text(update.message, "This event wasn't found. Try /list")
 
 
-def get_event_message(chat_id: int, event_id: Optional[int] = None) -> str:
+def get_event_message(
+    chat_id: int, event_id: Optional[int] = None, timezone: Optional[tzinfo] = None
+) -> str:
     """
     Generate the message for the event with `event_id`
     or the next event to happen for the chat.
@@ -304,38 +787,82 @@ def get_event_message(chat_id: int, event_id: Optional[int] = None) -> str:
     Args:
         chat_id (int): ID of the database chat
         event_id (Optional[int]): ID of the database event
+        timezone (Optional[tzinfo]): Time zone of the chat
 
     Returns:
         str: message to reply with markdown
     """
 
+    cache = get_reply_cache()
+    key = ("event", chat_id, _chat_generations.get(chat_id), event_id)
+    event_message = cache.get(key)
+    if event_message is not None:
+        return event_message
+
     event_data = get_event_data(chat_id=chat_id, event_id=event_id)
     
     if event_data is not None:
-        event_message = f"_{event_data['date']}_\n*{event_data['title']}*\n\n{event_data['text']}"
-        return escape_for_markdown_v2(event_message)
+        event_message = format_event_message(event_data, timezone)
+        # The next event (or occurrence) changes once it happens
+        recurring = event_data["recurrence"] is not None
+        boundary = event_data["date"] if event_id is None or recurring else None
+        cache.set(key, event_message, ttl=get_reply_ttl(boundary))
+        return event_message
     
     else:
         return ''
 
 
+def format_event_message(
+    event_data: Dict[str, Any], timezone: Optional[tzinfo] = None
+) -> str:
+    """
+    Generate the message for the data of an event
+
+    Args:
+        event_data (Dict[str, Any]): Event with its date, title and text
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        str: message with markdown
+    """
+
+    return render_event(event_data, timezone)
+
+
 def get_event_data(chat_id: int, event_id: Optional[int]) -> Optional[Dict[str,Any]]:
     """
     Get the data for a single event
 
+    A recurring event is dated with its next occurrence.
+
     Args:
         chat_id (int): ID of the chat that the event should belong to
         event_id (Optional[int]): ID of the event. None if it should get the next event
     """
 
     database = get_database()
+    current_date = utc_now()
+
+    select_query = select(
+        [
+            database.reminder.c.date,
+            database.reminder.c.title,
+            database.reminder.c.text,
+            database.reminder.c.recurrence,
+            database.chat.c.timezone,
+        ]
+    ).where(
+        and_(
+            database.reminder.c.chat_id == chat_id,
+            database.reminder.c.chat_id == database.chat.c.id,
+        )
+    )
 
-    select_query = (select([database.reminder.c.date, database.reminder.c.title ,database.reminder.c.text]).where(database.reminder.c.chat_id == chat_id))
-    
     if event_id is None:
-        current_date = datetime.now()
         select_query = (
             select_query.where(database.reminder.c.date > current_date)
+            .where(database.reminder.c.recurrence.is_(None))
             .order_by(asc(database.reminder.c.date))
             .limit(1)
         )
@@ -343,13 +870,27 @@ def get_event_data(chat_id: int, event_id: Optional[int]) -> Optional[Dict[str,A
     else:
         select_query = select_query.where(database.reminder.c.id==event_id)
 
+    select_query = select_query.execution_options(profile_name="get_event_data")
     result = database.engine.execute(select_query).first()
 
-    if result is None:
+    events = [] if result is None else [{**result}]
+    if event_id is None:
+        events.extend(get_recurring_events_db(chat_id=chat_id))
+
+    for event in events:
+        if event["recurrence"] is not None:
+            event["date"] = next_occurrence(
+                event["date"],
+                event["recurrence"],
+                current_date,
+                get_timezone(event["timezone"]),
+            )
+
+    if not events:
         return None
 
     else:
-        return {**result}
+        return min(events, key=lambda event: event["date"])
 
 
 EVENTS_HANDLERS = [
@@ -358,4 +899,5 @@ EVENTS_HANDLERS = [
     CommandHandler("list", list_events),
     CommandHandler("event", show_event),
     CommandHandler("pin", pin_event),
+    CommandHandler("search", search_events),
 ]
@@ -0,0 +1,340 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Prometheus metrics of the handlers, queries and Bot API calls
+###############################################################################
+from __future__ import annotations
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from threading import Lock, Thread
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Tuple, TYPE_CHECKING
+
+from sqlalchemy import event
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+    from telegram.ext import Handler
+
+
+logger = getLogger(__name__)
+
+# Seconds, from a cached reply to a slow Bot API call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_histograms: List[Histogram] = []
+
+
+class Histogram:
+    """
+    Latency histogram, by label values, in the Prometheus text format.
+
+    https://prometheus.io/docs/instrumenting/exposition_formats/
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label: str,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        """
+        Args:
+            name (str): Name of the metric
+            description (str): Help text of the metric
+            label (str): Name of the label splitting the observations
+            buckets (Tuple[float, ...]): Upper bounds of the buckets, sorted
+        """
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+
+        self._lock = Lock()
+        # Label value: observations per bucket (and over the last), sum
+        self._values: Dict[str, Tuple[List[int], float]] = {}
+        _histograms.append(self)
+
+    def observe(self, value: float, label_value: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(label_value, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[label_value] = (counts, total + value)
+
+    @contextmanager
+    def time(self, label_value: str) -> Iterator[None]:
+        """Observe the seconds spent in the block, even if it raises"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, label_value)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            values = [
+                (label_value, list(counts), total)
+                for label_value, (counts, total) in sorted(self._values.items())
+            ]
+
+        for label_value, counts, total in values:
+            label = f'{self.label}="{_escape_label(label_value)}"'
+            cumulative = 0
+            for bound, amount in zip(self.buckets, counts):
+                cumulative += amount
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+
+        return lines
+
+
+COMMAND_LATENCY = Histogram(
+    "reminderbot_command_duration_seconds", "Time handling a command", "command"
+)
+QUERY_LATENCY = Histogram(
+    "reminderbot_query_duration_seconds", "Time executing a query", "statement"
+)
+API_LATENCY = Histogram(
+    "reminderbot_api_duration_seconds", "Time calling the Bot API", "method"
+)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def instrument_handler(handler: Handler) -> None:
+    """
+    Observe the latency of the handler callback, by command
+
+    Args:
+        handler (Handler): Handler of the bot, before adding it to the dispatcher
+    """
+
+    name = handler.command[0] if hasattr(handler, "command") else type(handler).__name__
+    callback = handler.callback
+
+    @wraps(callback)
+    def timed_callback(update, context, *args, **kwargs):
+        with COMMAND_LATENCY.time(name):
+            return callback(update, context, *args, **kwargs)
+
+    handler.callback = timed_callback
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Observe the latency of the queries, by statement type (SELECT, INSERT...)
+
+    Args:
+        engine (Engine): Engine of the database
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        _observe_query(conn, statement)
+
+    @event.listens_for(engine, "handle_error")
+    def failed_query(exception_context):
+        if exception_context.connection is not None:
+            _observe_query(exception_context.connection, exception_context.statement)
+
+
+def _observe_query(conn, statement: str) -> None:
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+
+    statement_type = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    QUERY_LATENCY.observe(perf_counter() - starts.pop(), statement_type)
+
+
+def render_stats(
+    name: str, description: str, metric_type: str, samples: List[Tuple[str, Any]]
+) -> List[str]:
+    """
+    Render a metric with a sample per label (empty for the unlabeled one)
+
+    Args:
+        name (str): Name of the metric
+        description (str): Help text of the metric
+        metric_type (str): counter or gauge
+        samples (List[Tuple[str, Any]]): Labels (`key="value"`) and values
+
+    Returns:
+        List[str]: Lines of the metric
+    """
+
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}{labels} {value}")
+    return lines
+
+
+def collect_stats() -> List[str]:
+    """
+    Render the counters kept by the caches, the pool and the queues
+    """
+    # Imported here so the metrics don't load the whole bot
+    from reminderbot.conf import get_database
+    from reminderbot.deletion import get_deletion_queue
+    from reminderbot.events import get_reply_cache
+    from reminderbot.outbox import get_outbox
+    from reminderbot.utils import get_chat_cache, get_unregistered_chat_cache
+
+    caches = {
+        "chat": get_chat_cache().stats,
+        "unregistered_chat": get_unregistered_chat_cache().stats,
+        "reply": get_reply_cache().stats,
+    }
+    lines = []
+    for key, metric_type in (("hits", "counter"), ("misses", "counter")):
+        lines += render_stats(
+            f"reminderbot_cache_{key}_total",
+            f"Cache {key}",
+            metric_type,
+            [(f'cache="{cache}"', stats[key]) for cache, stats in caches.items()],
+        )
+    lines += render_stats(
+        "reminderbot_cache_entries",
+        "Entries in the cache",
+        "gauge",
+        [(f'cache="{cache}"', stats["size"]) for cache, stats in caches.items()],
+    )
+
+    for key, value in get_database().pool_stats.items():
+        metric_type = (
+            "counter" if key in ("checkouts", "checkout_wait_total") else "gauge"
+        )
+        lines += render_stats(
+            f"reminderbot_db_pool_{key}",
+            f"Connection pool {key.replace('_', ' ')}",
+            metric_type,
+            [("", value)],
+        )
+
+    outbox_stats = get_outbox().stats
+    lines += render_stats(
+        "reminderbot_outbox_queued",
+        "Messages waiting to be sent",
+        "gauge",
+        [("", outbox_stats["queued"])],
+    )
+    lines += render_stats(
+        "reminderbot_outbox_messages_total",
+        "Messages sent, failed and retried after a flood error",
+        "counter",
+        [
+            (f'outcome="{outcome}"', outbox_stats[outcome])
+            for outcome in ("sent", "failed", "retried")
+        ],
+    )
+    lines += render_stats(
+        "reminderbot_outbox_wait_seconds_total",
+        "Time the messages waited in the queue",
+        "counter",
+        [("", outbox_stats["wait_total"])],
+    )
+    lines += render_stats(
+        "reminderbot_outbox_wait_seconds_max",
+        "Longest time a message waited in the queue",
+        "gauge",
+        [("", outbox_stats["wait_max"])],
+    )
+
+    deletion_stats = get_deletion_queue().stats
+    lines += render_stats(
+        "reminderbot_deletions_pending",
+        "Messages waiting to be deleted",
+        "gauge",
+        [("", deletion_stats["pending"])],
+    )
+    lines += render_stats(
+        "reminderbot_deletions_total",
+        "Deletions by outcome",
+        "counter",
+        [
+            (f'outcome="{outcome}"', deletion_stats.get(outcome, 0))
+            for outcome in ("deleted", "retried", "dropped", "failed")
+        ],
+    )
+
+    return lines
+
+
+def render_metrics() -> str:
+    """
+    Render every metric in the Prometheus text format
+
+    Returns:
+        str: Text served by the metrics endpoint
+    """
+
+    lines = []
+    for histogram in _histograms:
+        lines += histogram.render()
+    lines += collect_stats()
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        try:
+            body = render_metrics().encode()
+        except Exception as err:
+            logger.error(f"Could not render the metrics: {err}")
+            self.send_error(500)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Every scrape would be logged otherwise
+        logger.debug(format % args)
+
+
+def start_metrics_server(listen: str, port: int) -> ThreadingHTTPServer:
+    """
+    Serve the metrics at `/metrics` from a background thread
+
+    Args:
+        listen (str): Local address of the server
+        port (int): Port of the server
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+
+    server = ThreadingHTTPServer((listen, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="Metrics", daemon=True).start()
+    return server
@@ -0,0 +1,232 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Versioned schema migrations
+###############################################################################
+from __future__ import annotations
+from datetime import datetime
+from logging import getLogger
+from typing import Callable, List, NamedTuple, Set, TYPE_CHECKING
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.types import DateTime, Integer
+
+from reminderbot.conf import get_default_timezone
+from reminderbot.database import REMINDER_SEARCH_DOCUMENT
+from reminderbot.dates import UTC, get_timezone, to_utc, utc_now
+from reminderbot.render import unescape_markdown_v2
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection
+    from reminderbot.database import Database
+
+
+logger = getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+    # Non transactional migrations run in autocommit,
+    # required by statements like `CREATE INDEX CONCURRENTLY`
+    transactional: bool = True
+
+
+def create_index(
+    connection: Connection, name: str, table: str, columns: str, using: str = ""
+) -> None:
+    """
+    Create an index without locking the writes on the table when possible
+
+    Args:
+        connection (Connection): Connection to the database (autocommit)
+        name (str): Name of the index
+        table (str): Name of the table
+        columns (str): Columns of the index, comma-separated
+        using (str): Index method (e.g. gin), defaults to the database one
+    """
+
+    concurrently = "CONCURRENTLY " if connection.dialect.name == "postgresql" else ""
+    method = f" USING {using}" if using else ""
+    connection.execute(
+        text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {name}"
+            f" ON {table}{method} ({columns})"
+        )
+    )
+
+
+def drop_index(connection: Connection, name: str) -> None:
+    """
+    Drop an index without locking the writes on the table when possible
+
+    Args:
+        connection (Connection): Connection to the database (autocommit)
+        name (str): Name of the index
+    """
+
+    concurrently = "CONCURRENTLY " if connection.dialect.name == "postgresql" else ""
+    connection.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+
+def add_reminder_chat_date_index(connection: Connection) -> None:
+    # Every query on reminder filters by chat and sorts by date,
+    # the composite index also covers the lookups on chat_id alone
+    create_index(
+        connection, "reminder_chat_id_date_idx", "reminder", "chat_id, date, id"
+    )
+    drop_index(connection, "ix_reminder_chat_id")
+
+
+def add_reminder_search(connection: Connection) -> None:
+    # Full-text search is only available in postgres,
+    # SQLite databases search with LIKE instead
+    if connection.dialect.name != "postgresql":
+        return
+
+    connection.execute(
+        text(
+            "ALTER TABLE reminder ADD COLUMN IF NOT EXISTS search tsvector"
+            f" GENERATED ALWAYS AS ({REMINDER_SEARCH_DOCUMENT}) STORED"
+        )
+    )
+    create_index(connection, "reminder_search_idx", "reminder", "search", using="gin")
+
+
+def add_reminder_recurrence(connection: Connection) -> None:
+    # Nullable without default, adding it doesn't rewrite the table
+    connection.execute(text("ALTER TABLE reminder ADD COLUMN recurrence TEXT"))
+
+
+def add_chat_timezone(connection: Connection) -> None:
+    # The dates were stored in the time zone of the server, which is
+    # the default one of the chats, and are stored in UTC from now on
+    timezone_name = get_default_timezone()
+    timezone = get_timezone(timezone_name)
+    connection.execute(
+        text("ALTER TABLE chat ADD COLUMN timezone TEXT NOT NULL DEFAULT 'UTC'")
+    )
+    connection.execute(
+        text("UPDATE chat SET timezone = :timezone"), timezone=timezone_name
+    )
+
+    if timezone == UTC:
+        return
+
+    select_query = text("SELECT id, date FROM reminder").columns(
+        id=Integer, date=DateTime
+    )
+    dates = [
+        {"reminder_id": row["id"], "date": to_utc(row["date"], timezone)}
+        for row in connection.execute(select_query)
+    ]
+    if dates:
+        update_query = text(
+            "UPDATE reminder SET date = :date WHERE id = :reminder_id"
+        ).bindparams(bindparam("date", type_=DateTime))
+        connection.execute(update_query, dates)
+
+
+def unescape_reminder_markdown(connection: Connection) -> None:
+    # The events were registered from the MarkdownV2 text of the message,
+    # they're stored as plain text and escaped when rendered now
+    select_query = text("SELECT id, title, text FROM reminder")
+    reminders = [
+        {
+            "reminder_id": row["id"],
+            "title": unescape_markdown_v2(row["title"]),
+            "text": unescape_markdown_v2(row["text"]),
+        }
+        for row in connection.execute(select_query)
+        if "\\" in row["title"] or "\\" in row["text"]
+    ]
+    if reminders:
+        update_query = text(
+            "UPDATE reminder SET title = :title, text = :text WHERE id = :reminder_id"
+        )
+        connection.execute(update_query, reminders)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        1,
+        "Composite index on reminder (chat_id, date, id)",
+        add_reminder_chat_date_index,
+        transactional=False,
+    ),
+    Migration(
+        2,
+        "Full-text search column on reminder (title, text)",
+        add_reminder_search,
+        transactional=False,
+    ),
+    Migration(3, "Recurrence rule on reminder", add_reminder_recurrence),
+    Migration(4, "Time zone of the chats, reminder dates in UTC", add_chat_timezone),
+    Migration(5, "Plain text reminder titles and texts", unescape_reminder_markdown),
+]
+
+
+def get_applied_versions(database: Database) -> Set[int]:
+    results = database.engine.execute(select([database.schema_version.c.version]))
+    return {row["version"] for row in results}
+
+
+def record_version(
+    connection: Connection, database: Database, migration: Migration
+) -> None:
+    connection.execute(
+        database.schema_version.insert().values(
+            version=migration.version,
+            description=migration.description,
+            applied_at=utc_now(),
+        )
+    )
+
+
+def stamp_database(database: Database) -> None:
+    """
+    Record every migration as applied, for databases created with the latest schema
+
+    Args:
+        database (Database): Database to stamp
+    """
+
+    applied_versions = get_applied_versions(database)
+    with database.engine.begin() as connection:
+        for migration in MIGRATIONS:
+            if migration.version not in applied_versions:
+                record_version(connection, database, migration)
+
+
+def migrate_database(database: Database) -> None:
+    """
+    Apply the pending migrations in order, recording each one once applied
+
+    Args:
+        database (Database): Database to migrate
+    """
+
+    applied_versions = get_applied_versions(database)
+    pending = [m for m in MIGRATIONS if m.version not in applied_versions]
+    if not pending:
+        logger.info("The database is up to date")
+        return
+
+    for migration in sorted(pending, key=lambda m: m.version):
+        logger.info(f"Applying migration {migration.version}: {migration.description}")
+
+        if migration.transactional:
+            with database.engine.begin() as connection:
+                migration.upgrade(connection)
+                record_version(connection, database, migration)
+
+        else:
+            with database.engine.connect() as connection:
+                migration.upgrade(
+                    connection.execution_options(isolation_level="AUTOCOMMIT")
+                )
+            with database.engine.begin() as connection:
+                record_version(connection, database, migration)
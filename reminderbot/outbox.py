@@ -0,0 +1,371 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Rate limited queue of the messages sent by the bot
+###############################################################################
+from __future__ import annotations
+from bisect import insort
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from enum import IntEnum
+from itertools import count
+from logging import getLogger
+from threading import Condition, Thread
+from time import monotonic
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+from telegram.error import RetryAfter
+
+from reminderbot.conf import get_outbox_options
+from reminderbot.metrics import API_LATENCY
+
+if TYPE_CHECKING:
+    from telegram import Message
+
+
+logger = getLogger(__name__)
+
+# Seconds a chat is remembered after its last message
+CHAT_WINDOW = 60
+
+_outbox = None
+
+
+class Priority(IntEnum):
+    # Answers to the commands, someone is waiting for them
+    reply = 0
+    # Messages nobody asked for right now, like the reminders
+    bulk = 1
+
+
+class OutboxItem:
+    def __init__(
+        self,
+        priority: Priority,
+        order: int,
+        chat_id: int,
+        call: Callable,
+        args: Tuple,
+        kwargs: Dict[str, Any],
+    ) -> None:
+        self.priority = priority
+        self.order = order
+        self.chat_id = chat_id
+        self.call = call
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.queued_at = monotonic()
+
+    def __lt__(self, other: OutboxItem) -> bool:
+        return (self.priority, self.order) < (other.priority, other.order)
+
+
+class Outbox:
+    """
+    Send the messages of the bot within the telegram rate limits.
+
+    https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+
+    Messages are sent by priority and in order, skipping the ones of chats
+    that reached their limit until they can send again. A flood error delays
+    the message (and the rest of its chat) for the time telegram asks.
+    A chat sends one message at a time, so its messages keep their order
+    even when a request lasts longer than the interval between them.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        group_rate: int = 20,
+        workers: int = 4,
+    ) -> None:
+        """
+        Args:
+            global_rate (float): Messages per second across all the chats
+            chat_rate (float): Messages per second in a chat
+            group_rate (int): Messages per minute in a group
+            workers (int): Concurrent requests to the Bot API
+        """
+        self.global_interval = 1 / global_rate
+        self.chat_interval = 1 / chat_rate
+        self.group_rate = group_rate
+
+        self._pending: List[OutboxItem] = []
+        self._order = count()
+        self._condition = Condition()
+        self._global_ready_at = 0.0
+        # Last sends and flood waits of each chat
+        self._chat_sends: Dict[int, Deque[float]] = {}
+        self._chat_paused: Dict[int, float] = {}
+        # Chats with a message being sent
+        self._busy_chats: Set[int] = set()
+        self._pruned_at = monotonic()
+        self._stats = {
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "wait_total": 0.0,
+            "wait_max": 0.0,
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="Outbox"
+        )
+        self._thread: Optional[Thread] = None
+
+    def send(
+        self,
+        chat_id: int,
+        call: Callable,
+        /,
+        *args,
+        priority: Priority = Priority.reply,
+        **kwargs,
+    ) -> Future:
+        """
+        Queue a call to the Bot API sending a message to a chat
+
+        Args:
+            chat_id (int): Telegram chat receiving the message
+            call (Callable): Method of the bot (or message) sending it
+            *args: Positional arguments of the call, `chat_id` and `call`
+                are positional-only so the call can take a `chat_id` too
+            priority (Priority): Priority of the message
+            **kwargs: Keyword arguments of the call
+
+        Returns:
+            Future: Result of the call once sent
+        """
+
+        item = OutboxItem(priority, next(self._order), chat_id, call, args, kwargs)
+        with self._condition:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="Outbox", daemon=True)
+                self._thread.start()
+
+            insort(self._pending, item)
+            self._condition.notify()
+
+        return item.future
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters of the queue
+
+        Returns:
+            Dict[str, Any]: queued messages, sent, failed and retried (flood
+                errors) ones, and total and maximum seconds waited in the queue
+        """
+
+        with self._condition:
+            return {"queued": len(self._pending), **self._stats}
+
+    def _chat_ready_at(self, chat_id: int) -> float:
+        ready_at = self._chat_paused.get(chat_id, 0.0)
+        sends = self._chat_sends.get(chat_id)
+        if sends:
+            ready_at = max(ready_at, sends[-1] + self.chat_interval)
+            # Groups (negative IDs) also have a limit per minute
+            if chat_id < 0 and len(sends) == self.group_rate:
+                ready_at = max(ready_at, sends[0] + CHAT_WINDOW)
+        return ready_at
+
+    def _take(self, now: float) -> Tuple[Optional[OutboxItem], Optional[float]]:
+        """
+        Take the first message that can be sent now
+
+        Returns:
+            Optional[OutboxItem]: Message to send, if any
+            Optional[float]: Otherwise when the next one can be sent, if any
+        """
+
+        if self._global_ready_at > now:
+            return None, self._global_ready_at
+
+        wake_at = None
+        for index, item in enumerate(self._pending):
+            # Woken up when its message is sent
+            if item.chat_id in self._busy_chats:
+                continue
+            ready_at = self._chat_ready_at(item.chat_id)
+            if ready_at <= now:
+                return self._pending.pop(index), None
+            wake_at = ready_at if wake_at is None else min(wake_at, ready_at)
+
+        return None, wake_at
+
+    def _record_send(self, chat_id: int, now: float) -> None:
+        self._global_ready_at = now + self.global_interval
+        sends = self._chat_sends.get(chat_id)
+        if sends is None:
+            sends = self._chat_sends[chat_id] = deque(maxlen=self.group_rate)
+        sends.append(now)
+
+        # Forget the chats which can't be limited anymore
+        if now - self._pruned_at > CHAT_WINDOW:
+            self._pruned_at = now
+            self._chat_sends = {
+                chat: sends
+                for chat, sends in self._chat_sends.items()
+                if now - sends[-1] < CHAT_WINDOW
+            }
+            self._chat_paused = {
+                chat: ready_at
+                for chat, ready_at in self._chat_paused.items()
+                if ready_at > now
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                item, wake_at = self._take(monotonic())
+                while item is None:
+                    timeout = None if wake_at is None else wake_at - monotonic()
+                    self._condition.wait(timeout)
+                    item, wake_at = self._take(monotonic())
+
+                now = monotonic()
+                self._busy_chats.add(item.chat_id)
+                self._record_send(item.chat_id, now)
+                wait = now - item.queued_at
+                self._stats["wait_total"] += wait
+                self._stats["wait_max"] = max(self._stats["wait_max"], wait)
+
+            self._executor.submit(self._send, item)
+
+    def _send(self, item: OutboxItem) -> None:
+        try:
+            self._call(item)
+        finally:
+            with self._condition:
+                self._busy_chats.discard(item.chat_id)
+                self._condition.notify()
+
+    def _call(self, item: OutboxItem) -> None:
+        if not item.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            with API_LATENCY.time(getattr(item.call, "__name__", "unknown")):
+                result = item.call(*item.args, **item.kwargs)
+
+        except RetryAfter as err:
+            # Hold the chat and send it again in the same position
+            logger.warning(f"Flood limit on {item.chat_id}: {err}")
+            with self._condition:
+                self._chat_paused[item.chat_id] = monotonic() + float(err.retry_after)
+                self._stats["retried"] += 1
+                item.future = _requeued_future(item.future)
+                insort(self._pending, item)
+                self._condition.notify()
+
+        except Exception as err:
+            logger.error(f"Could not send a message to {item.chat_id}: {err}")
+            with self._condition:
+                self._stats["failed"] += 1
+            item.future.set_exception(err)
+
+        else:
+            with self._condition:
+                self._stats["sent"] += 1
+            item.future.set_result(result)
+
+
+def _requeued_future(running: Future) -> Future:
+    """
+    A running future can't go back to pending, so the new one
+    for the retry copies its result to the one the caller has.
+    """
+
+    future: Future = Future()
+
+    def copy_result(retried: Future) -> None:
+        if retried.exception() is not None:
+            running.set_exception(retried.exception())
+        else:
+            running.set_result(retried.result())
+
+    future.add_done_callback(copy_result)
+    return future
+
+
+def get_outbox() -> Outbox:
+    """
+    Get the outbound messages queue of the bot or create it
+
+    Returns:
+        Outbox: Queue of the messages to send
+    """
+
+    if _outbox is None:
+        return init_outbox()
+
+    return _outbox
+
+
+def init_outbox(share: float = 1.0) -> Outbox:
+    """
+    Create the outbound messages queue of the bot
+
+    Args:
+        share (float): Part of the global rate limit this process can use,
+            when the bot runs in several processes
+
+    Returns:
+        Outbox: Queue of the messages to send
+    """
+
+    global _outbox
+    global_rate, chat_rate, group_rate, workers = get_outbox_options()
+    _outbox = Outbox(global_rate * share, chat_rate, group_rate, workers)
+    return _outbox
+
+
+def reply_text(message: Message, text: str, **kwargs) -> Future:
+    """
+    Queue a plain text reply to a message
+
+    The command message may be deleted before the reply leaves the queue,
+    then the reply is sent without quoting it.
+
+    Args:
+        message (Message): Message to reply
+        text (str): Text of the reply
+
+    Returns:
+        Future: The sent message, once sent
+    """
+
+    kwargs.setdefault("allow_sending_without_reply", True)
+    return get_outbox().send(message.chat_id, message.reply_text, text, **kwargs)
+
+
+def reply_markdown_v2(message: Message, text: str, **kwargs) -> Future:
+    """
+    Queue a MarkdownV2 reply to a message, without quoting it once deleted
+    as `reply_text`
+
+    Args:
+        message (Message): Message to reply
+        text (str): Text of the reply, with its markdown escaped
+
+    Returns:
+        Future: The sent message, once sent
+    """
+
+    kwargs.setdefault("allow_sending_without_reply", True)
+    return get_outbox().send(message.chat_id, message.reply_markdown_v2, text, **kwargs)
@@ -0,0 +1,112 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Slow query log and query plans of the profiled queries
+###############################################################################
+from __future__ import annotations
+from logging import getLogger
+from time import perf_counter
+from typing import Any, TYPE_CHECKING
+
+from sqlalchemy import event
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, Engine
+
+
+logger = getLogger(__name__)
+
+# Execution option naming the queries whose plan is captured, e.g.
+# `select_query.execution_options(profile_name="list_events_db")`
+PROFILE_OPTION = "profile_name"
+
+
+def instrument_slow_queries(engine: Engine, threshold_ms: float, explain: bool) -> None:
+    """
+    Log the queries slower than the threshold, with their parameters
+
+    Args:
+        engine (Engine): Engine of the database
+        threshold_ms (float): Milliseconds from which a query is logged (0=never)
+        explain (bool): Log the plan of the queries with a `profile_name`
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiling_query_start", []).append(perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("profiling_query_start")
+        if not starts:
+            return
+
+        elapsed_ms = (perf_counter() - starts.pop()) * 1000
+        if threshold_ms and elapsed_ms >= threshold_ms:
+            logger.warning(
+                f"Slow query ({elapsed_ms:.1f}ms): {statement}\n"
+                f"Parameters: {parameters}"
+            )
+
+        profile_name = context.execution_options.get(PROFILE_OPTION)
+        if explain and profile_name and not executemany:
+            plan = explain_query(conn, statement, parameters)
+            if plan:
+                logger.debug(
+                    f"Plan of {profile_name} ({elapsed_ms:.1f}ms):\n{plan}\n"
+                    f"Parameters: {parameters}"
+                )
+
+    @event.listens_for(engine, "handle_error")
+    def failed_query(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("profiling_query_start"):
+            connection.info["profiling_query_start"].pop()
+
+
+def explain_query(conn: Connection, statement: str, parameters: Any) -> str:
+    """
+    Get the plan of a query as run by the database
+
+    PostgreSQL runs the query again with `EXPLAIN ANALYZE`,
+    SQLite only has the plan it would use (`EXPLAIN QUERY PLAN`).
+
+    Args:
+        conn (Connection): Connection that ran the query
+        statement (str): SQL of the query, as sent to the database
+        parameters (Any): Bound parameters of the query
+
+    Returns:
+        str: The plan, empty if it couldn't be captured
+    """
+
+    if conn.dialect.name == "postgresql":
+        explain = "EXPLAIN ANALYZE "
+    elif conn.dialect.name == "sqlite":
+        explain = "EXPLAIN QUERY PLAN "
+    else:
+        return ""
+
+    # A raw cursor, so the plan isn't profiled itself
+    cursor = conn.connection.cursor()
+    # An error would abort the transaction of the query in postgres
+    savepoint = conn.dialect.name == "postgresql"
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT reminderbot_explain")
+        cursor.execute(explain + statement, parameters)
+        plan = "\n".join(" ".join(str(value) for value in row) for row in cursor)
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT reminderbot_explain")
+        return plan
+
+    except Exception as err:
+        logger.debug(f"Could not explain the query: {err}")
+        if savepoint:
+            cursor.execute("ROLLBACK TO SAVEPOINT reminderbot_explain")
+        return ""
+
+    finally:
+        cursor.close()
@@ -0,0 +1,231 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Occurrences of the recurring events
+###############################################################################
+from __future__ import annotations
+from calendar import monthrange
+from datetime import datetime, timedelta, tzinfo
+from typing import Any, Dict, Iterator, Optional
+
+from reminderbot.dates import from_utc, get_timezone, to_utc
+
+# Rules with a fixed interval between occurrences
+INTERVALS = {
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "biweekly": timedelta(weeks=2),
+}
+# Rules on the same day of the month (or the last one, if it's shorter)
+MONTHS = {
+    "monthly": 1,
+    "yearly": 12,
+}
+RECURRENCES = (*INTERVALS, *MONTHS)
+
+# Listing all the events stops at the occurrences of the next year
+RECURRENCE_HORIZON = timedelta(days=366)
+
+
+def parse_recurrence(rule: str) -> Optional[str]:
+    """
+    Get the recurrence rule from the text of a message
+
+    Args:
+        rule (str): Rule as written by the user
+
+    Returns:
+        Optional[str]: The rule, None to stop repeating ("never")
+
+    Raises:
+        ValueError: If it isn't a known rule
+    """
+
+    rule = rule.strip().lower()
+    if rule in ("never", "none", "no"):
+        return None
+
+    if rule not in RECURRENCES:
+        raise ValueError(f"Unknown recurrence: {rule}")
+
+    return rule
+
+
+def get_occurrence(base: datetime, rule: str, index: int) -> datetime:
+    """
+    Get an occurrence of a recurring event
+
+    Args:
+        base (datetime): Date of the first occurrence
+        rule (str): Recurrence rule
+        index (int): Number of the occurrence, from 0
+
+    Returns:
+        datetime: Date of the occurrence
+    """
+
+    if rule in INTERVALS:
+        return base + INTERVALS[rule] * index
+
+    month = base.month - 1 + MONTHS[rule] * index
+    year = base.year + month // 12
+    month = month % 12 + 1
+    day = min(base.day, monthrange(year, month)[1])
+    return base.replace(year=year, month=month, day=day)
+
+
+def _approximate_index(base: datetime, rule: str, date: datetime) -> int:
+    """Index of an occurrence at or before `date`, close to it"""
+    if date <= base:
+        return 0
+
+    if rule in INTERVALS:
+        return (date - base) // INTERVALS[rule]
+
+    months = (date.year - base.year) * 12 + date.month - base.month
+    return max(months // MONTHS[rule] - 1, 0)
+
+
+def iter_occurrences(
+    base: datetime,
+    rule: str,
+    after: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+    reverse: bool = False,
+    timezone: Optional[tzinfo] = None,
+) -> Iterator[datetime]:
+    """
+    Generate the occurrences of a recurring event between two dates (excluded)
+
+    Only the occurrences that are iterated are calculated, so without `before`
+    the ascending generator is endless.
+
+    Args:
+        base (datetime): Date of the first occurrence
+        rule (str): Recurrence rule
+        after (Optional[datetime]): Generate the occurrences after this date
+        before (Optional[datetime]): Generate the occurrences before this date,
+            required when `reverse`
+        reverse (bool): Generate them from the latest to the first one
+        timezone (Optional[tzinfo]): Time zone of the chat, the dates are in
+            UTC and the event repeats at the same local time across the
+            daylight saving changes
+
+    Yields:
+        datetime: Date of the occurrence
+
+    Raises:
+        ValueError: If `reverse` without `before`
+    """
+
+    if timezone is None:
+        yield from _iter_occurrences(base, rule, after, before, reverse)
+        return
+
+    local_base = from_utc(base, timezone)
+    local_after, local_before = (
+        None if date is None else from_utc(date, timezone) for date in (after, before)
+    )
+    occurrences = _iter_occurrences(
+        local_base, rule, local_after, local_before, reverse
+    )
+    for occurrence in occurrences:
+        yield to_utc(occurrence, timezone)
+
+
+def _iter_occurrences(
+    base: datetime,
+    rule: str,
+    after: Optional[datetime],
+    before: Optional[datetime],
+    reverse: bool,
+) -> Iterator[datetime]:
+    if not reverse:
+        index = _approximate_index(base, rule, after) if after else 0
+        while True:
+            occurrence = get_occurrence(base, rule, index)
+            if before is not None and occurrence >= before:
+                return
+            if after is None or occurrence > after:
+                yield occurrence
+            index += 1
+
+    else:
+        if before is None:
+            raise ValueError("The reverse occurrences need an end date")
+        index = _approximate_index(base, rule, before) + 1
+        while index >= 0:
+            occurrence = get_occurrence(base, rule, index)
+            if after is not None and occurrence <= after:
+                return
+            if occurrence < before:
+                yield occurrence
+            index -= 1
+
+
+def next_occurrence(
+    base: datetime, rule: str, after: datetime, timezone: Optional[tzinfo] = None
+) -> datetime:
+    """
+    Get the first occurrence of a recurring event after a date
+
+    Args:
+        base (datetime): Date of the first occurrence
+        rule (str): Recurrence rule
+        after (datetime): Date the occurrence has to be after
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        datetime: Date of the occurrence
+    """
+
+    return next(iter_occurrences(base, rule, after=after, timezone=timezone))
+
+
+def is_occurrence(
+    base: datetime, rule: str, date: datetime, timezone: Optional[tzinfo] = None
+) -> bool:
+    """
+    Check if a date is one of the occurrences of a recurring event
+
+    Args:
+        base (datetime): Date of the first occurrence
+        rule (str): Recurrence rule
+        date (datetime): Date to check
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        bool: True if the event happens at that date
+    """
+
+    after = date - timedelta.resolution
+    return next_occurrence(base, rule, after, timezone) == date
+
+
+def iter_event_occurrences(
+    event: Dict[str, Any],
+    after: Optional[datetime] = None,
+    before: Optional[datetime] = None,
+    reverse: bool = False,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Generate the occurrences of a recurring event as events with their date
+
+    Args:
+        event (Dict[str, Any]): Event with its first `date`, `recurrence`
+            and the `timezone` of its chat
+        after (Optional[datetime]): Generate the occurrences after this date
+        before (Optional[datetime]): Generate the occurrences before this date
+        reverse (bool): Generate them from the latest to the first one
+
+    Yields:
+        Dict[str, Any]: Copy of the event for each occurrence
+    """
+
+    timezone = get_timezone(event.get("timezone"))
+    for occurrence in iter_occurrences(
+        event["date"], event["recurrence"], after, before, reverse, timezone
+    ):
+        yield {**event, "date": occurrence}
@@ -1,22 +1,31 @@
 from __future__ import annotations
-from datetime import datetime
-from typing import Tuple, TYPE_CHECKING
+from datetime import datetime, tzinfo
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 from logging import getLogger
 
-from sqlalchemy import text
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, literal_column, select
+from sqlalchemy.dialects import postgresql, sqlite
 from telegram.ext import CommandHandler
 
-from reminderbot.conf import get_database
+from reminderbot.conf import get_database, get_default_timezone
+from reminderbot.dates import from_utc, get_timezone, utc_now
+from reminderbot.events import invalidate_chat_replies
+from reminderbot.outbox import reply_text
+from reminderbot.recurrence import RECURRENCES, next_occurrence, parse_recurrence
+from reminderbot.scheduler import schedule_event
 from reminderbot.utils import (
     remove_command_message,
     send_typing_action,
+    add_registered_chat,
+    get_chat_timezone,
     get_enabled_chat,
-    parse_message_to_event,
+    parse_message_to_events,
+    update_chat_timezone,
 )
 
 if TYPE_CHECKING:
     from telegram import Update
+    from reminderbot.database import Database
 
 
 logger = getLogger(__name__)
@@ -29,7 +38,7 @@ def register_chat(update: Update, context) -> None:
     chat_id = chat.id
     chat_name = chat.title
     logger.info(f"Register\nID: {chat_id}\nNAME: '{chat_name}'")
-    update.message.reply_text(f"'{chat_name}' may be registered Soon\u2122")
+    reply_text(update.message, f"'{chat_name}' may be registered Soon\u2122")
 
     register_chat_db(chat_id=chat_id, chat_name=chat_name)
 
@@ -46,68 +55,137 @@ def register_event(update: Update, context) -> None:
 
     if chat_id is None:
         update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
-        update.message.reply_text(update_message)
+        reply_text(update.message, update_message)
         return
 
-    try:
-        # We need to ignore the first 10 characters which are "/register "
-        message_text = update.message.text_markdown_v2[10:]
-        event_date, event_title, event_message = parse_message_to_event(message_text)
+    # We need to ignore the first 10 characters which are "/register "
+    # The events are stored as plain text, they are escaped when rendered
+    timezone = get_chat_timezone(telegram_chat_id)
+    events, failed_lines = parse_message_to_events(update.message.text[10:], timezone)
 
-    except Exception as err:
-        # Retry without markdown
-        message_text = update.message.text[10:]
-        try:
-            event_date, event_title, event_message = parse_message_to_event(message_text)
-
-        except Exception as err:
-            update_message = "Could not process the event. Should have the format: '/register <date (dd-mm-yyyy HH:MM)>|<title>|<message>'"
-            logger.error(update_message)
-            logger.error(f"Exception: {err}")
-            logger.error(f"Message:\n{update.message.text}")
-            update.message.reply_text(update_message)
-            return
+    if not events:
+        update_message = "Could not process the event. Should have the format: '/register <date (dd-mm-yyyy HH:MM, tomorrow HH:MM, in 2h...)>|<title>|<message>'"
+        logger.error(update_message)
+        logger.error(f"Message:\n{update.message.text}")
+        reply_text(update.message, update_message)
+        return
 
     try:
-        register_event_db(
-            chat_id=chat_id,
-            date=event_date,
-            title=event_title,
-            message=event_message,
-        )
-        update_message = f"Registered: '{event_title}' on the {event_date}"
-        update.message.reply_text(update_message)
-
-    except IntegrityError as err:
-        pass
+        results = upsert_events_db(chat_id=chat_id, events=events)
 
     except Exception as err:
         update_message = "Something went wrong. Try again later."
-        logger.error("Something failed inserting the event")
+        logger.error("Something failed registering the events")
         logger.error(f"Got: {err}")
-        logger.error(
-            f"ChatID:{chat_id}\nDate:{event_date}\nTitle:{event_title}\nMessage:{event_message}"
+        logger.error(f"ChatID:{chat_id}\nEvents:{events}")
+        reply_text(update.message, update_message)
+        return
+
+    if len(events) == 1 and not failed_lines:
+        event_date, event_title, _event_message = events[0]
+        event_id, inserted = results[0]
+        action = "Registered" if inserted else "Updated"
+        event_date = from_utc(event_date, timezone)
+        update_message = f"{action}: '{event_title}' on the {event_date} <{event_id}>"
+
+    else:
+        inserted_amount = sum(1 for _event_id, inserted in results if inserted)
+        update_message = (
+            f"Registered: {inserted_amount}\n"
+            f"Updated: {len(results) - inserted_amount}\n"
+            f"Failed: {len(failed_lines)}"
         )
-        update.message.reply_text(update_message)
+        if failed_lines:
+            logger.error("Could not process the lines:\n" + "\n".join(failed_lines))
+            update_message += "\n" + "\n".join(f"- {line}" for line in failed_lines)
+
+    reply_text(update.message, update_message)
+
+
+@remove_command_message
+@send_typing_action
+def repeat_event(update: Update, context) -> None:
+    """
+    Set how often an event repeats, from its date.
+    Format:
+    /repeat <eventId> <daily|weekly|biweekly|monthly|yearly|never>
+    """
+    logger.info("Handle 'repeat'")
 
+    telegram_chat_id = update.message.chat.id
+    telegram_chat_name = update.message.chat.title
+
+    chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
+
+    if chat_id is None:
+        update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
+        reply_text(update.message, update_message)
+        return
+
+    # We need to ignore the first 8 characters which are "/repeat "
     try:
-        update_event_db(
-            chat_id=chat_id,
-            date=event_date,
-            title=event_title,
-            message=event_message,
-        )
-        update_message = "\N{THUMBS UP SIGN}"
+        event_id_str, rule = update.message.text[8:].split()
+        event_id = int(event_id_str)
+        recurrence = parse_recurrence(rule)
+
+    except ValueError:
+        rules = "|".join(RECURRENCES)
+        update_message = f"Should have the format: '/repeat <eventId> <{rules}|never>'"
+        reply_text(update.message, update_message)
+        return
 
-    except Exception as err:
-        update_message = "Something went wrong. Try again later."
-        logger.error("Something failed updating the event")
-        logger.error(f"Got: {err}")
-        logger.error(
-            f"ChatID:{chat_id}\nDate:{event_date}\nTitle:{event_title}\nMessage:{event_message}"
+    timezone = get_chat_timezone(telegram_chat_id)
+    if not set_event_recurrence_db(chat_id, event_id, recurrence, timezone):
+        reply_text(update.message, "This event wasn't found. Try /list")
+        return
+
+    if recurrence is None:
+        update_message = f"The event <{event_id}> won't repeat"
+    else:
+        update_message = f"The event <{event_id}> repeats {recurrence}"
+    reply_text(update.message, update_message)
+
+
+@send_typing_action
+def set_timezone(update: Update, context) -> None:
+    """
+    Show or set the time zone the dates of the chat are written and shown in.
+    Format:
+    /timezone [<IANA time zone, e.g. Europe/Madrid>]
+    """
+    logger.info("Handle 'timezone'")
+
+    telegram_chat_id = update.message.chat.id
+    telegram_chat_name = update.message.chat.title
+
+    chat_id = get_enabled_chat(telegram_chat_id, telegram_chat_name)
+
+    if chat_id is None:
+        update_message = "This chat hasn't been allowed. Try /register_chat and send a message to the owner."
+        reply_text(update.message, update_message)
+        return
+
+    # We need to ignore the first 10 characters which are "/timezone "
+    timezone_name = update.message.text[10:].strip()
+    if not timezone_name:
+        timezone = get_chat_timezone(telegram_chat_id)
+        reply_text(update.message, f"The time zone of this chat is {timezone}")
+        return
+
+    try:
+        timezone = get_timezone(timezone_name)
+
+    except ValueError:
+        update_message = (
+            f"Unknown time zone '{timezone_name}'. Try a name like Europe/Madrid"
         )
+        reply_text(update.message, update_message)
+        return
 
-    update.message.reply_text(update_message)
+    update_chat_timezone(chat_id, str(timezone))
+    # The stored dates don't change, only how they are shown
+    invalidate_chat_replies(chat_id)
+    reply_text(update.message, f"The time zone of this chat is now {timezone}")
 
 
 def register_chat_db(chat_id: int, chat_name: str) -> None:
@@ -120,10 +198,16 @@ def register_chat_db(chat_id: int, chat_name: str) -> None:
     """
 
     database = get_database()
-    insert_values = {'chat_id': chat_id, 'name': chat_name}
+    insert_values = {
+        "chat_id": chat_id,
+        "name": chat_name,
+        "timezone": get_default_timezone(),
+    }
     insert_query = database.chat.insert().values(insert_values)
     database.engine.execute(insert_query)
 
+    add_registered_chat(chat_id)
+
 
 def register_event_db(chat_id: int, date: datetime, title: str, message: str) -> None:
     """
@@ -140,7 +224,10 @@ def register_event_db(chat_id: int, date: datetime, title: str, message: str) ->
 
     insert_values = {"chat_id": chat_id, "title": title, "date": date, "text": message}
     insert_query = database.reminder.insert().values(insert_values)
-    database.engine.execute(insert_query)
+    result = database.engine.execute(insert_query)
+
+    invalidate_chat_replies(chat_id)
+    schedule_event(result.inserted_primary_key[0], date)
 
 
 def update_event_db(chat_id: int, date: datetime, title: str, message: str) -> None:
@@ -156,22 +243,196 @@ def update_event_db(chat_id: int, date: datetime, title: str, message: str) -> N
 
     database = get_database()
 
-    update_query = text(
-        """
-        UPDATE reminder
-        SET text = :message
-        WHERE
-            chat_id = :chat_id
-            AND title = :title
-            AND date = :date
-        """
+    reminder = database.reminder
+    update_query = (
+        reminder.update()
+        .where(
+            and_(
+                reminder.c.chat_id == chat_id,
+                reminder.c.title == title,
+                reminder.c.date == date,
+            )
+        )
+        .values(text=message)
     )
-    database.engine.execute(
-        update_query, chat_id=chat_id, date=date, title=title, message=message
+    database.engine.execute(update_query)
+
+    invalidate_chat_replies(chat_id)
+
+
+def set_event_recurrence_db(
+    chat_id: int,
+    event_id: int,
+    recurrence: Optional[str],
+    timezone: Optional[tzinfo] = None,
+) -> bool:
+    """
+    Set the recurrence rule of an event, its date becomes the first occurrence
+
+    Args:
+        chat_id (int): ID of the chat (database)
+        event_id (int): ID of the event
+        recurrence (Optional[str]): Rule of reminderbot.recurrence,
+            None for a one-off event
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        bool: True if the event was found
+    """
+
+    database = get_database()
+
+    reminder = database.reminder
+    event_filter = and_(reminder.c.id == event_id, reminder.c.chat_id == chat_id)
+    with database.engine.begin() as connection:
+        date = connection.execute(
+            select([reminder.c.date]).where(event_filter)
+        ).scalar()
+        if date is None:
+            return False
+
+        connection.execute(
+            reminder.update().where(event_filter).values(recurrence=recurrence)
+        )
+
+    invalidate_chat_replies(chat_id)
+    if recurrence is not None:
+        date = next_occurrence(date, recurrence, utc_now(), timezone)
+    schedule_event(event_id, date)
+
+    return True
+
+
+def upsert_event_db(
+    chat_id: int, date: datetime, title: str, message: str
+) -> Tuple[int, bool]:
+    """
+    Register the event in the database or update its message if it already exists
+
+    Args:
+        chat_id (int): ID of the chat (database)
+        date (datetime): Time of the event
+        title (str): Title of the event
+        message (str): Description of the event
+
+    Returns:
+        int: ID of the event
+        bool: True if the event was inserted, False if it was updated
+    """
+
+    return upsert_events_db(chat_id=chat_id, events=[(date, title, message)])[0]
+
+
+def upsert_events_db(
+    chat_id: int, events: List[Tuple[datetime, str, str]]
+) -> List[Tuple[int, bool]]:
+    """
+    Register the events in the database or update their message if they already exist
+
+    It's a single statement (and transaction) relying on the
+    `reminder_chat_title_date_unique` constraint.
+
+    Args:
+        chat_id (int): ID of the chat (database)
+        events (List[Tuple[datetime, str, str]]): Events as (date, title, message)
+
+    Returns:
+        List[Tuple[int, bool]]: For each event, its ID and
+            whether it was inserted (True) or updated (False)
+    """
+
+    database = get_database()
+
+    # A statement can't update the same row twice, keep the last repeated event
+    insert_values: Dict[Tuple[datetime, str], Dict] = {}
+    for date, title, message in events:
+        insert_values[(date, title)] = {
+            "chat_id": chat_id,
+            "title": title,
+            "date": date,
+            "text": message,
+        }
+
+    if database.is_sqlite:
+        results = _upsert_events_sqlite(database, chat_id, insert_values)
+    else:
+        results = _upsert_events_postgresql(database, insert_values)
+
+    invalidate_chat_replies(chat_id)
+    for (date, _title), (event_id, inserted) in results.items():
+        if inserted:
+            schedule_event(event_id, date)
+
+    return [results[(date, title)] for date, title, _message in events]
+
+
+def _upsert_events_postgresql(
+    database: Database, insert_values: Dict[Tuple[datetime, str], Dict]
+) -> Dict[Tuple[datetime, str], Tuple[int, bool]]:
+    """
+    Upsert the events in a single statement returning their IDs
+    """
+
+    insert_query = postgresql.insert(database.reminder).values(
+        list(insert_values.values())
     )
+    upsert_query = insert_query.on_conflict_do_update(
+        constraint="reminder_chat_title_date_unique",
+        set_={"text": insert_query.excluded.text},
+    ).returning(
+        database.reminder.c.id,
+        database.reminder.c.date,
+        database.reminder.c.title,
+        # xmax is only set on the row versions created by an UPDATE
+        literal_column("(xmax = 0)").label("inserted"),
+    )
+    with database.engine.begin() as connection:
+        return {
+            (row["date"], row["title"]): (row["id"], row["inserted"])
+            for row in connection.execute(upsert_query)
+        }
+
+
+def _upsert_events_sqlite(
+    database: Database,
+    chat_id: int,
+    insert_values: Dict[Tuple[datetime, str], Dict],
+) -> Dict[Tuple[datetime, str], Tuple[int, bool]]:
+    """
+    Upsert the events in a single transaction.
+
+    SQLite (with SQLAlchemy 1.x) has no RETURNING,
+    so the existing events are read before and after the upsert.
+    """
+
+    reminder = database.reminder
+    titles = {title for _date, title in insert_values}
+    select_query = select([reminder.c.id, reminder.c.date, reminder.c.title]).where(
+        and_(reminder.c.chat_id == chat_id, reminder.c.title.in_(titles))
+    )
+
+    insert_query = sqlite.insert(reminder).values(list(insert_values.values()))
+    upsert_query = insert_query.on_conflict_do_update(
+        index_elements=[reminder.c.chat_id, reminder.c.title, reminder.c.date],
+        set_={"text": insert_query.excluded.text},
+    )
+    with database.engine.begin() as connection:
+        existing = {
+            (row["date"], row["title"]) for row in connection.execute(select_query)
+        }
+        connection.execute(upsert_query)
+
+        results = {}
+        for row in connection.execute(select_query):
+            key = (row["date"], row["title"])
+            if key in insert_values:
+                results[key] = (row["id"], key not in existing)
+        return results
 
 
 REGISTER_HANDLERS = [
     CommandHandler("register_chat", register_chat),
     CommandHandler("register", register_event),
+    CommandHandler("repeat", repeat_event),
+    CommandHandler("timezone", set_timezone),
 ]
@@ -0,0 +1,179 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: MarkdownV2 rendering of the replies
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, tzinfo
+from typing import Any, Dict, Optional
+import re
+
+from reminderbot.dates import from_utc
+
+# https://core.telegram.org/bots/api#markdownv2-style
+MARKDOWN_V2_RESERVED = "\\_*[]()~`>#+-=|{}.!"
+
+# The backslash goes first so the added ones aren't escaped again
+_ESCAPES = [(char, f"\\{char}") for char in MARKDOWN_V2_RESERVED]
+_ESCAPED_RE = re.compile(f"\\\\([{re.escape(MARKDOWN_V2_RESERVED)}])")
+
+
+def escape_markdown_v2(value: Any) -> str:
+    """
+    Escape a value so it's shown as-is in a MarkdownV2 message.
+
+    Only the reserved characters present in the text are replaced.
+    `str.translate` would be a single pass, but it's slower in CPython
+    than a few `str.replace` on the short fields of an event.
+
+    Args:
+        value (Any): Text (or value converted to text) without escaped characters
+
+    Returns:
+        str: Text with every reserved character escaped
+    """
+
+    text = str(value)
+    if isinstance(value, datetime):
+        # The only reserved characters of a datetime
+        return text.replace("-", "\\-").replace(".", "\\.")
+
+    for char, escaped_char in _ESCAPES:
+        if char in text:
+            text = text.replace(char, escaped_char)
+    return text
+
+
+def unescape_markdown_v2(text: str) -> str:
+    """
+    Remove the escapes of the reserved characters of a MarkdownV2 text
+
+    Args:
+        text (str): Text with escaped characters
+
+    Returns:
+        str: Text as shown in telegram
+    """
+
+    return _ESCAPED_RE.sub(r"\1", text)
+
+
+def render_list_header(amount: int, date_filter_name: str) -> str:
+    """
+    Render the header of a list of events
+
+    Args:
+        amount (int): Amount of events requested (0=all)
+        date_filter_name (str): Name of the date filter, empty if there isn't one
+
+    Returns:
+        str: Header with markdown
+    """
+
+    amount_str = str(amount) if amount else "All"
+    date_str = f" {date_filter_name}" if date_filter_name else ""
+    return f"*{escape_markdown_v2(amount_str + date_str)} events:*\n"
+
+
+def render_search_header(amount: int, terms: str) -> str:
+    """
+    Render the header of the results of a search
+
+    Args:
+        amount (int): Amount of events found
+        terms (str): Terms searched
+
+    Returns:
+        str: Header with markdown
+    """
+
+    return f"*{escape_markdown_v2(f'{amount} events matching {terms!r}')}:*\n"
+
+
+def render_date(date: datetime, timezone: Optional[tzinfo]) -> str:
+    """
+    Render the (UTC) date of an event in the time zone of the chat
+
+    Args:
+        date (datetime): Date as stored
+        timezone (Optional[tzinfo]): Time zone of the chat, None to keep it
+
+    Returns:
+        str: Date with markdown
+    """
+
+    if timezone is not None:
+        date = from_utc(date, timezone)
+    return escape_markdown_v2(date)
+
+
+def truncate_markdown_v2(text: str, length: int) -> str:
+    """
+    Cut an escaped text without splitting an escaped character
+
+    Args:
+        text (str): Text with the reserved characters escaped
+        length (int): Maximum length
+
+    Returns:
+        str: The first `length` characters at most, still correctly escaped
+    """
+
+    text = text[: max(length, 0)]
+    # Every backslash starts an escape, an odd trailing run is a split one
+    if (len(text) - len(text.rstrip("\\"))) % 2:
+        text = text[:-1]
+    return text
+
+
+def render_event_line(
+    event: Dict[str, Any],
+    timezone: Optional[tzinfo] = None,
+    max_length: Optional[int] = None,
+) -> str:
+    """
+    Render an event as a line of a list
+
+    Args:
+        event (Dict[str, Any]): Event with its id, date and title
+        timezone (Optional[tzinfo]): Time zone of the chat
+        max_length (Optional[int]): Maximum length of the line, the title is
+            truncated to fit
+
+    Returns:
+        str: Line with markdown
+    """
+
+    date = render_date(event["date"], timezone)
+    title = escape_markdown_v2(event["title"])
+    line = f"\\-\\[{date}\\] *{title}* _<{event['id']}\\>_"
+    if max_length is None or len(line) <= max_length:
+        return line
+
+    # -1 for the ellipsis
+    title_length = max_length - (len(line) - len(title)) - 1
+    title = truncate_markdown_v2(title, title_length) + "…"
+    return f"\\-\\[{date}\\] *{title}* _<{event['id']}\\>_"
+
+
+def render_event(event: Dict[str, Any], timezone: Optional[tzinfo] = None) -> str:
+    """
+    Render the full message of an event
+
+    Args:
+        event (Dict[str, Any]): Event with its date, title, text
+            and optionally its recurrence
+        timezone (Optional[tzinfo]): Time zone of the chat
+
+    Returns:
+        str: Message with markdown
+    """
+
+    date = render_date(event["date"], timezone)
+    if event.get("recurrence"):
+        date += f", {escape_markdown_v2(event['recurrence'])}"
+    title = escape_markdown_v2(event["title"])
+    text = escape_markdown_v2(event["text"])
+    return f"_{date}_\n*{title}*\n\n{text}"
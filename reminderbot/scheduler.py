@@ -0,0 +1,330 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Delivery of the reminders when their date arrives
+###############################################################################
+from __future__ import annotations
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from logging import getLogger
+from threading import Condition, Thread
+from typing import List, Optional, Set, Tuple, TYPE_CHECKING
+import sys
+
+from sqlalchemy import and_, or_, select
+
+from reminderbot.conf import get_database, get_scheduler_options
+from reminderbot.dates import get_timezone, utc_now
+from reminderbot.events import format_event_message
+from reminderbot.outbox import Priority, get_outbox
+from reminderbot.recurrence import is_occurrence, iter_occurrences
+
+if TYPE_CHECKING:
+    from telegram import Bot
+
+
+logger = getLogger(__name__)
+
+_scheduler = None
+
+
+class ReminderScheduler:
+    """
+    Send the reminders when their date arrives.
+
+    Only the reminders within a look-ahead window are kept in a heap,
+    loaded in batches ordered by `(date, id)`. The thread sleeps until the
+    next reminder is due or the window has to be moved forward, and new
+    reminders inside the loaded window are pushed with `add`.
+
+    The reminders added by other processes are found by reloading the
+    window from the current time every `refresh`.
+
+    The recurring reminders are pushed once for each occurrence in the window.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        lookahead: timedelta,
+        batch_size: int,
+        refresh: Optional[timedelta] = None,
+    ) -> None:
+        """
+        Args:
+            bot (Bot): Telegram bot used to send the reminders
+            lookahead (timedelta): How far in the future the reminders are loaded
+            batch_size (int): Maximum amount of reminders loaded at once
+            refresh (Optional[timedelta]): Time between reloads of the window
+        """
+        self.bot = bot
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        self.refresh = refresh
+
+        self._heap: List[Tuple[datetime, int]] = []
+        self._scheduled: Set[Tuple[int, datetime]] = set()
+        # Every reminder up to (date, id) has already been loaded
+        self._cursor: Tuple[datetime, int] = (utc_now(), sys.maxsize)
+        self._refresh_at = utc_now() + refresh if refresh else datetime.max
+        self._condition = Condition()
+        self._stopped = False
+        self._thread = Thread(target=self._run, name="ReminderScheduler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def add(self, event_id: int, date: datetime) -> None:
+        """
+        Schedule a new reminder if it belongs to the loaded window.
+
+        Later reminders will be loaded when the window reaches them,
+        past ones (e.g. old events imported in bulk) are never sent.
+
+        Args:
+            event_id (int): ID of the reminder
+            date (datetime): Time of the reminder
+        """
+
+        if date <= utc_now():
+            return
+
+        with self._condition:
+            if (date, event_id) > self._cursor or (event_id, date) in self._scheduled:
+                return
+
+            self._push(event_id, date)
+            self._condition.notify()
+
+    def _push(self, event_id: int, date: datetime) -> None:
+        self._scheduled.add((event_id, date))
+        heappush(self._heap, (date, event_id))
+
+    def _refresh_window(self, now: datetime, refresh: timedelta) -> None:
+        """
+        Move the cursor back to now, so the window is loaded again
+
+        The reminders before now were already delivered, and the ones already
+        in the heap are skipped. A cursor behind now stays there, the rest of
+        a full batch before now hasn't been loaded yet.
+
+        Args:
+            now (datetime): Current time
+            refresh (timedelta): Time until the next refresh
+        """
+
+        self._cursor = min(self._cursor, (now, sys.maxsize))
+        self._refresh_at = now + refresh
+
+    def _load_window(self) -> None:
+        """
+        Load the next batch of reminders after the cursor within the look-ahead
+        """
+
+        database = get_database()
+        reminder = database.reminder
+
+        cursor_date, cursor_id = self._cursor
+        window_end = utc_now() + self.lookahead
+        select_query = (
+            select([reminder.c.id, reminder.c.date])
+            .where(reminder.c.recurrence.is_(None))
+            .where(
+                or_(
+                    reminder.c.date > cursor_date,
+                    and_(reminder.c.date == cursor_date, reminder.c.id > cursor_id),
+                )
+            )
+            .where(reminder.c.date <= window_end)
+            .order_by(reminder.c.date, reminder.c.id)
+            .limit(self.batch_size)
+        )
+        rows = database.engine.execute(select_query).fetchall()
+
+        for row in rows:
+            if (row["id"], row["date"]) not in self._scheduled:
+                self._push(row["id"], row["date"])
+
+        if len(rows) == self.batch_size:
+            self._cursor = (rows[-1]["date"], rows[-1]["id"])
+        else:
+            self._cursor = (window_end, sys.maxsize)
+
+        self._load_occurrences((cursor_date, cursor_id), self._cursor)
+
+        logger.debug(f"Loaded {len(rows)} reminders until {self._cursor[0]}")
+
+    def _load_occurrences(
+        self, start: Tuple[datetime, int], end: Tuple[datetime, int]
+    ) -> None:
+        """
+        Push the occurrences of the recurring reminders between two cursors
+
+        Args:
+            start (Tuple[datetime, int]): Cursor before loading the batch
+            end (Tuple[datetime, int]): Cursor after loading it
+        """
+
+        database = get_database()
+        reminder = database.reminder
+        chat = database.chat
+
+        select_query = select(
+            [reminder.c.id, reminder.c.date, reminder.c.recurrence, chat.c.timezone]
+        ).where(
+            and_(
+                reminder.c.recurrence.isnot(None),
+                reminder.c.date <= end[0],
+                reminder.c.chat_id == chat.c.id,
+            )
+        )
+
+        for row in database.engine.execute(select_query):
+            occurrences = iter_occurrences(
+                row["date"],
+                row["recurrence"],
+                after=start[0] - timedelta.resolution,
+                before=end[0] + timedelta.resolution,
+                timezone=get_timezone(row["timezone"]),
+            )
+            for occurrence in occurrences:
+                key = (occurrence, row["id"])
+                if (
+                    start < key <= end
+                    and (row["id"], occurrence) not in self._scheduled
+                ):
+                    self._push(row["id"], occurrence)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+
+                now = utc_now()
+                if self._heap and self._heap[0][0] <= now:
+                    date, event_id = heappop(self._heap)
+                    self._scheduled.discard((event_id, date))
+
+                elif (not self._heap and self._cursor[0] <= now) or (
+                    self._refresh_at <= now
+                ):
+                    if self.refresh is not None and self._refresh_at <= now:
+                        self._refresh_window(now, self.refresh)
+                    try:
+                        self._load_window()
+                    except Exception as err:
+                        logger.error(f"Could not load the reminders: {err}")
+                        self._condition.wait(self.lookahead.total_seconds())
+                    continue
+
+                else:
+                    next_wake = self._heap[0][0] if self._heap else self._cursor[0]
+                    next_wake = min(next_wake, self._refresh_at)
+                    self._condition.wait((next_wake - now).total_seconds())
+                    continue
+
+            self._deliver(event_id, date)
+
+    def _deliver(self, event_id: int, date: datetime) -> None:
+        """
+        Send the reminder to its chat.
+
+        The event is read again so the message has the latest text,
+        and skipped if it was removed or moved meanwhile.
+
+        Args:
+            event_id (int): ID of the reminder
+            date (datetime): Time it was scheduled for
+        """
+
+        database = get_database()
+        reminder = database.reminder
+        chat = database.chat
+
+        select_query = select(
+            [
+                reminder.c.date,
+                reminder.c.title,
+                reminder.c.text,
+                reminder.c.recurrence,
+                chat.c.chat_id,
+                chat.c.timezone,
+            ]
+        ).where(and_(reminder.c.id == event_id, reminder.c.chat_id == chat.c.id))
+
+        try:
+            row = database.engine.execute(select_query).first()
+            if row is None:
+                return
+
+            event_data = {**row}
+            timezone = get_timezone(event_data["timezone"])
+            recurrence = event_data["recurrence"]
+            if recurrence is None:
+                if event_data["date"] != date:
+                    return
+            elif is_occurrence(event_data["date"], recurrence, date, timezone):
+                event_data["date"] = date
+            else:
+                return
+
+            # The reminders wait for the command replies
+            get_outbox().send(
+                event_data["chat_id"],
+                self.bot.send_message,
+                chat_id=event_data["chat_id"],
+                text=format_event_message(event_data, timezone),
+                parse_mode="MarkdownV2",
+                priority=Priority.bulk,
+            )
+
+        except Exception as err:
+            logger.error(f"Could not deliver the reminder {event_id}: {err}")
+
+
+def start_scheduler(bot: Bot) -> Optional[ReminderScheduler]:
+    """
+    Start delivering the reminders if it's enabled in the confs
+
+    Args:
+        bot (Bot): Telegram bot used to send the reminders
+
+    Returns:
+        Optional[ReminderScheduler]: The running scheduler, if enabled
+    """
+
+    global _scheduler
+
+    enabled, lookahead, batch_size, refresh = get_scheduler_options()
+    if not enabled:
+        return None
+
+    _scheduler = ReminderScheduler(
+        bot,
+        lookahead=timedelta(seconds=lookahead),
+        batch_size=batch_size,
+        refresh=timedelta(seconds=refresh) if refresh else None,
+    )
+    _scheduler.start()
+    return _scheduler
+
+
+def schedule_event(event_id: int, date: datetime) -> None:
+    """
+    Let the running scheduler know about a new reminder
+
+    Args:
+        event_id (int): ID of the reminder
+        date (datetime): Time of the reminder
+    """
+
+    if _scheduler is not None:
+        _scheduler.add(event_id, date)
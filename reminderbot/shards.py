@@ -0,0 +1,269 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Authors:
+# - Ytturi
+# - gdalmau
+# Descr: Chats split across worker processes
+###############################################################################
+from __future__ import annotations
+from logging import getLogger
+from multiprocessing import get_context
+from queue import Queue
+from threading import Thread
+from time import sleep
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from sqlalchemy import func, select
+
+from reminderbot.conf import (
+    get_database,
+    get_scheduler_options,
+    get_telegram_api_options,
+    init_logger,
+    read_configs,
+)
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue as ProcessQueue
+    from sqlalchemy.engine import Connection
+    from telegram import Bot
+    from reminderbot.database import Database
+
+
+logger = getLogger(__name__)
+
+# Key of the postgres advisory lock held by the process delivering the reminders
+SCHEDULER_LOCK_ID = 7_221_148_453
+
+# Connection holding the advisory lock, the lock is released when it's closed
+_lock_connection = None
+
+
+def shard_of(chat_id: int, shards: int) -> int:
+    """
+    Get the shard handling a chat
+
+    Args:
+        chat_id (int): Telegram chat ID
+        shards (int): Amount of shards
+
+    Returns:
+        int: Index of the shard, between 0 and shards - 1
+    """
+
+    return int(chat_id) % shards
+
+
+def try_advisory_lock(database: Database, lock_id: int) -> Optional[Connection]:
+    """
+    Try to take a postgres advisory lock without waiting
+
+    Args:
+        database (Database): Postgres database shared by the shards
+        lock_id (int): Key of the lock
+
+    Returns:
+        Optional[Connection]: Connection holding the lock, if taken
+    """
+
+    connection = database.engine.connect()
+    try:
+        if connection.execute(select([func.pg_try_advisory_lock(lock_id)])).scalar():
+            return connection
+
+    except Exception as err:
+        logger.error(f"Could not take the advisory lock {lock_id}: {err}")
+
+    connection.close()
+    return None
+
+
+def holds_advisory_lock(connection: Connection) -> bool:
+    """
+    Check if the connection holding an advisory lock is still alive
+
+    The lock lasts as long as the session, it's lost when the connection
+    breaks (e.g. postgres restarted).
+
+    Args:
+        connection (Connection): Connection that took the lock
+
+    Returns:
+        bool: True if the lock is still held
+    """
+
+    try:
+        connection.execute(select([1])).scalar()
+        return True
+
+    except Exception as err:
+        logger.error(f"Lost the connection holding the advisory lock: {err}")
+        return False
+
+
+def start_singleton_scheduler(bot: Bot, shard: int) -> None:
+    """
+    Deliver the reminders from only one of the shards (or processes).
+
+    The shards compete for an advisory lock, retrying every scheduler refresh
+    so another one takes over if the one with the lock stops. The one with
+    the lock checks it on every refresh too, and stops delivering once lost.
+    SQLite has no advisory locks, the first shard always delivers them.
+
+    Args:
+        bot (Bot): Telegram bot used to send the reminders
+        shard (int): Index of this shard
+    """
+
+    from reminderbot.scheduler import start_scheduler
+
+    database = get_database()
+    enabled, _lookahead, _batch_size, refresh = get_scheduler_options()
+    if not enabled:
+        return
+
+    if database.is_sqlite:
+        if shard == 0 and start_scheduler(bot):
+            logger.info(f"Shard {shard} delivering reminders")
+        return
+
+    def keep_lock() -> None:
+        global _lock_connection
+        scheduler = None
+        while True:
+            if _lock_connection is None:
+                _lock_connection = try_advisory_lock(database, SCHEDULER_LOCK_ID)
+                if _lock_connection is not None:
+                    scheduler = start_scheduler(bot)
+                    logger.info(f"Shard {shard} delivering reminders")
+
+            elif not holds_advisory_lock(_lock_connection):
+                if scheduler is not None:
+                    scheduler.stop()
+                    scheduler = None
+                logger.warning(f"Shard {shard} stopped delivering reminders")
+                _lock_connection.invalidate()
+                _lock_connection = None
+                continue
+
+            sleep(refresh or 60)
+
+    Thread(target=keep_lock, name="SchedulerLock", daemon=True).start()
+
+
+def run_shard(
+    shard: int,
+    shards: int,
+    token: str,
+    updates: ProcessQueue,
+    options: Dict[str, Any],
+) -> None:
+    """
+    Handle the updates of the chats of a shard, in its own process
+
+    Args:
+        shard (int): Index of this shard
+        shards (int): Amount of shards
+        token (str): Telegram token of the bot
+        updates (ProcessQueue): Updates (as dicts) sent by the coordinator,
+            None to stop
+        options (Dict[str, Any]): Options of the listener (config, verbose,
+            debug, run_async and workers)
+    """
+
+    from telegram import Bot, Update
+    from telegram.ext import Dispatcher
+    from telegram.utils.request import Request
+
+    from reminderbot.bot import init_bot
+    from reminderbot.outbox import init_outbox
+
+    read_configs(options["config"])
+    init_logger(options["verbose"], options["debug"])
+
+    # The telegram limit of messages per second is for the whole bot
+    init_outbox(share=1 / shards)
+
+    # A connection for each handler and the threads of the queues
+    request = Request(con_pool_size=options["workers"] + 8)
+    bot = Bot(token, request=request, **get_telegram_api_options())
+    dispatcher = Dispatcher(bot, Queue(), workers=options["workers"], use_context=True)
+    init_bot(dispatcher, options["run_async"], shard=shard)
+    if get_database().enabled:
+        start_singleton_scheduler(bot, shard)
+
+    dispatcher_thread = Thread(target=dispatcher.start, name="Dispatcher")
+    dispatcher_thread.start()
+    logger.info(f"Shard {shard} has started!")
+
+    try:
+        while True:
+            update = updates.get()
+            if update is None:
+                break
+            dispatcher.update_queue.put(Update.de_json(update, bot))
+
+    except KeyboardInterrupt:
+        # The coordinator stops the shards
+        pass
+
+    finally:
+        dispatcher.stop()
+        dispatcher_thread.join()
+        logger.info(f"Shard {shard} has stopped")
+
+
+def run_coordinator(
+    token: str, shards: int, webhook: bool, options: Dict[str, Any]
+) -> None:
+    """
+    Receive the updates and send each one to the shard of its chat
+
+    Args:
+        token (str): Telegram token of the bot
+        shards (int): Amount of worker processes
+        webhook (bool): Use a webhook instead of polling
+        options (Dict[str, Any]): Options of the listener for the shards
+    """
+
+    from telegram import Update
+    from telegram.ext import TypeHandler, Updater
+
+    from reminderbot.bot import listen
+
+    # Spawned, so the shards don't inherit the connections of the coordinator
+    context = get_context("spawn")
+    queues: List[ProcessQueue] = [context.Queue() for _ in range(shards)]
+    processes = [
+        context.Process(
+            target=run_shard,
+            args=(shard, shards, token, queues[shard], options),
+            name=f"Shard-{shard}",
+        )
+        for shard in range(shards)
+    ]
+    for process in processes:
+        process.start()
+
+    def route(update: Update, _context) -> None:
+        chat = update.effective_chat
+        shard = shard_of(chat.id, shards) if chat is not None else 0
+        if not processes[shard].is_alive():
+            logger.error(f"Shard {shard} is not running, dropping update")
+            return
+        queues[shard].put(update.to_dict())
+
+    updater = Updater(token, use_context=True, **get_telegram_api_options())
+    updater.dispatcher.add_handler(TypeHandler(Update, route))
+
+    logger.info(f"ReminderBot has started with {shards} shards!")
+    try:
+        listen(updater, webhook)
+    finally:
+        for shard_queue in queues:
+            shard_queue.put(None)
+        for process in processes:
+            process.join(timeout=10)
+        logger.info(
+            "Shutting down\nBot is going to sleep (...)\nNo more reminders today (...)\nZzz"
+        )
@@ -6,33 +6,76 @@
 # Descr: Utils for the bot
 ###############################################################################
 from __future__ import annotations
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, tzinfo
 from functools import wraps
+from logging import getLogger
 from random import randint, choice
-from typing import Callable, Optional, Tuple, TYPE_CHECKING
+from threading import Lock
+from time import monotonic
+from typing import Callable, List, Optional, Tuple, TYPE_CHECKING
 
-from sqlalchemy import select, text
+from sqlalchemy import select
 import telegram
 
-from reminderbot.conf import get_debug_enabled, get_database
+from reminderbot.cache import BloomFilter, LRUCache
+from reminderbot.conf import (
+    get_chat_cache_options,
+    get_chat_filter_options,
+    get_debug_enabled,
+    get_database,
+)
+from reminderbot.dates import UTC, from_utc, get_timezone, parse_date, to_utc, utc_now
+from reminderbot.deletion import get_deletion_queue
+from reminderbot.metrics import API_LATENCY
 
 if TYPE_CHECKING:
-    from telegram import User
+    from telegram import Bot, User
+
+
+logger = getLogger(__name__)
+
+# Seconds telegram shows the typing action (or until a message is sent)
+TYPING_ACTION_DURATION = 5
+
+# The threads are only started when the first action is sent
+_typing_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="TypingAction")
+_typing_chats = LRUCache(max_size=1024, ttl=TYPING_ACTION_DURATION)
+_chat_cache = None
+_unregistered_chat_cache = None
+_chat_filter = None
+_chat_filter_loaded_at = 0.0
+_chat_filter_lock = Lock()
 
 
 def send_typing_action(func: Callable) -> Callable:
-    """Sends typing action while processing func command."""
+    """
+    Sends typing action while processing func command.
+
+    The action is sent in the background so the command doesn't wait for it,
+    and only once per chat while telegram is still showing it.
+    """
 
     @wraps(func)
     def command_func(update, context, *args, **kwargs):
-        context.bot.send_chat_action(
-            chat_id=update.effective_message.chat_id, action=telegram.ChatAction.TYPING
-        )
+        chat_id = update.effective_message.chat_id
+        if _typing_chats.get(chat_id) is None:
+            _typing_chats.set(chat_id, True)
+            _typing_executor.submit(_send_typing, context.bot, chat_id)
         return func(update, context, *args, **kwargs)
 
     return command_func
 
 
+def _send_typing(bot: Bot, chat_id: int) -> None:
+    try:
+        with API_LATENCY.time("send_chat_action"):
+            bot.send_chat_action(chat_id=chat_id, action=telegram.ChatAction.TYPING)
+    except Exception as err:
+        # It's only cosmetic, the command goes on anyway
+        logger.debug(f"Could not send the typing action to {chat_id}: {err}")
+
+
 def remove_command_message(func: Callable) -> Callable:
     """Removes the message that triggered the handler."""
 
@@ -41,15 +84,10 @@ def remove_command_message(func: Callable) -> Callable:
         if get_debug_enabled():
             return func(update, context, *args, **kwargs)
         return_value = func(update, context, *args, **kwargs)
-        # Try to remove the original message
-        try:
-            update.effective_message.delete()
-        except:
-            # It raises an exception if
-            # - it's already removed
-            # - it doesn't have permissions
-            # But we don't care
-            pass
+        # Remove the original message from the background,
+        # failures are retried or dropped by the queue
+        message = update.effective_message
+        get_deletion_queue().push(context.bot, message.chat_id, message.message_id)
         return return_value
 
     return command_func
@@ -68,6 +106,103 @@ def get_username(telegram_user: User) -> str:
     return telegram_user.username or telegram_user.full_name
 
 
+def get_chat_cache() -> LRUCache:
+    """
+    Get the cache of enabled chats or create it with the sizes from the confs
+
+    It maps the telegram `chat_id` to the chat row `(id, name, timezone)`
+
+    Returns:
+        LRUCache: Cache of enabled chats
+    """
+
+    global _chat_cache
+    if _chat_cache is None:
+        size, ttl = get_chat_cache_options()
+        _chat_cache = LRUCache(max_size=size, ttl=ttl)
+
+    return _chat_cache
+
+
+def get_unregistered_chat_cache() -> LRUCache:
+    """
+    Get the cache of telegram `chat_id`s known not to be registered
+
+    Returns:
+        LRUCache: Cache of unregistered chats
+    """
+
+    global _unregistered_chat_cache
+    if _unregistered_chat_cache is None:
+        size, _ttl = get_chat_cache_options()
+        negative_ttl, _refresh = get_chat_filter_options()
+        _unregistered_chat_cache = LRUCache(max_size=size, ttl=negative_ttl)
+
+    return _unregistered_chat_cache
+
+
+def load_chat_filter() -> BloomFilter:
+    """
+    (Re)build the filter of registered chats from the `chat` table
+
+    Returns:
+        BloomFilter: Filter with every registered telegram `chat_id`
+    """
+
+    global _chat_filter, _chat_filter_loaded_at
+
+    database = get_database()
+    results = database.engine.execute(select([database.chat.c.chat_id]))
+    chat_ids = [row["chat_id"] for row in results]
+
+    # Leave room for the chats registered until the next reload
+    size, _ttl = get_chat_cache_options()
+    chat_filter = BloomFilter(capacity=max(2 * len(chat_ids), size))
+    for chat_id in chat_ids:
+        chat_filter.add(int(chat_id))
+
+    _chat_filter = chat_filter
+    _chat_filter_loaded_at = monotonic()
+    return chat_filter
+
+
+def get_chat_filter() -> BloomFilter:
+    """
+    Get the filter of registered chats.
+
+    It is reloaded periodically to catch chats added outside the bot.
+
+    Returns:
+        BloomFilter: Filter with every registered telegram `chat_id`
+    """
+
+    _negative_ttl, refresh = get_chat_filter_options()
+    chat_filter = _chat_filter
+    if chat_filter is None or monotonic() - _chat_filter_loaded_at > refresh:
+        with _chat_filter_lock:
+            # Another worker may have reloaded it while waiting for the lock
+            chat_filter = _chat_filter
+            if chat_filter is None or monotonic() - _chat_filter_loaded_at > refresh:
+                chat_filter = load_chat_filter()
+
+    return chat_filter
+
+
+def add_registered_chat(chat_id: int) -> None:
+    """
+    Mark a telegram `chat_id` as registered in the chat caches
+
+    Args:
+        chat_id (int): chat_id from the telegram chat
+    """
+
+    chat_id = int(chat_id)
+    get_chat_cache().pop(chat_id)
+    get_unregistered_chat_cache().pop(chat_id)
+    if _chat_filter is not None:
+        _chat_filter.add(chat_id)
+
+
 def get_enabled_chat(chat_id: int, chat_name: str) -> Optional[int]:
     """
     Verify that the `chat_id` is registered in the database.
@@ -81,17 +216,66 @@ def get_enabled_chat(chat_id: int, chat_name: str) -> Optional[int]:
         Optional[int]: ID of the chat when it exists, otherwise `None`
     """
 
+    chat_id = int(chat_id)
+    cache = get_chat_cache()
+    cached_chat = cache.get(chat_id)
+    if cached_chat is not None:
+        row_id, name, timezone = cached_chat
+        if name != chat_name:
+            update_chat(row_id, chat_name)
+            cache.set(chat_id, (row_id, chat_name, timezone))
+        return row_id
+
+    # Unregistered chats are rejected without a query
+    unregistered_cache = get_unregistered_chat_cache()
+    if unregistered_cache.get(chat_id) is not None:
+        return None
+    if chat_id not in get_chat_filter():
+        unregistered_cache.set(chat_id, True)
+        return None
+
     database = get_database()
 
-    select_query = select([database.chat.c.id, database.chat.c.name]).where(
-        database.chat.c.chat_id == chat_id
+    select_query = (
+        select([database.chat.c.id, database.chat.c.name, database.chat.c.timezone])
+        .where(database.chat.c.chat_id == chat_id)
+        .execution_options(profile_name="get_enabled_chat")
     )
     result = database.engine.execute(select_query).first()
-    if result is not None:
-        if result["name"] != chat_name:
-            update_chat(result["id"], result["name"])
+    if result is None:
+        unregistered_cache.set(chat_id, True)
+        return None
+
+    if result["name"] != chat_name:
+        update_chat(result["id"], chat_name)
+
+    cache.set(chat_id, (result["id"], chat_name, result["timezone"]))
+    return result["id"]
 
-    return result["id"] if result is not None else None
+
+def get_chat_timezone(chat_id: int) -> tzinfo:
+    """
+    Get the time zone of an enabled chat.
+
+    It's read from the chat cache filled by `get_enabled_chat`.
+
+    Args:
+        chat_id (int): chat_id from the telegram chat
+
+    Returns:
+        tzinfo: Time zone the dates of the chat are written and shown in
+    """
+
+    chat_id = int(chat_id)
+    cached_chat = get_chat_cache().get(chat_id)
+    if cached_chat is not None:
+        return get_timezone(cached_chat[2])
+
+    database = get_database()
+    select_query = select([database.chat.c.timezone]).where(
+        database.chat.c.chat_id == chat_id
+    )
+    return get_timezone(database.engine.execute(select_query).scalar())
 
 
 def update_chat(chat_id: int, chat_name: str) -> None:
@@ -103,55 +287,117 @@ def update_chat(chat_id: int, chat_name: str) -> None:
         chat_name (str): [description]
     """
 
-    update_query = text(
-        """
-        UPDATE chat SET name = :chat_name WHERE id = :chat_id
-        """
+    database = get_database()
+    update_query = (
+        database.chat.update()
+        .where(database.chat.c.id == chat_id)
+        .values(name=chat_name)
     )
+    database.engine.execute(update_query)
+
+    # The cache is keyed by the telegram chat_id, not the row ID.
+    # Renames are rare enough to just drop every cached chat.
+    get_chat_cache().clear()
+
+
+def update_chat_timezone(chat_id: int, timezone_name: str) -> None:
+    """
+    Update the time zone of the chat in the database
+
+    Args:
+        chat_id (int): ID of the chat (row ID)
+        timezone_name (str): IANA name of the time zone
+    """
 
     database = get_database()
-    database.engine.execute(update_query, chat_name=chat_name, chat_id=chat_id)
+    update_query = (
+        database.chat.update()
+        .where(database.chat.c.id == chat_id)
+        .values(timezone=timezone_name)
+    )
+    database.engine.execute(update_query)
 
+    # As with the renames, the cache is keyed by the telegram chat_id
+    get_chat_cache().clear()
 
-def parse_message_to_event(message_text: str) -> Tuple[datetime, str, str]:
+
+def parse_message_to_event(
+    message_text: str, now: Optional[datetime] = None, timezone: tzinfo = UTC
+) -> Tuple[datetime, str, str]:
     """
     Parse the message text into the three attributes of an event
 
     Args:
         message_text (str): Raw text of the message
+        now (Optional[datetime]): Current time (UTC) for the relative dates
+        timezone (tzinfo): Time zone the date is written in
 
     Returns:
-        datetime: Time of the event
+        datetime: Time of the event (UTC)
         str: Title of the event
         str: Description of the event
+
+    Raises:
+        ValueError: If the date can't be parsed
     """
 
     event_date_str, event_title, event_message = message_text.split("|", 3)
     event_date_str = event_date_str.strip()
     event_title = event_title.strip()
     event_message = event_message.strip()
-    event_date = datetime.strptime(event_date_str, "%d-%m-%Y %H:%M")
+    local_now = from_utc(now or utc_now(), timezone)
+    event_date = parse_date(event_date_str, local_now)
+    try:
+        event_date = to_utc(event_date, timezone)
+    except OverflowError:
+        raise ValueError(f"Date out of range: {event_date_str!r}")
 
     return event_date, event_title, event_message
 
 
-def escape_for_markdown_v2(message: str) -> str:
+def parse_message_to_events(
+    message_text: str, timezone: tzinfo = UTC
+) -> Tuple[List[Tuple[datetime, str, str]], List[str]]:
     """
-    Escape a message so it can be sent with markdown_v2
+    Parse a message with one or more events, one per line.
+
+    Each event line can start with "/register". Lines without "|" continue
+    the description of the previous event, so single events can still have
+    multi-line descriptions.
 
     Args:
-        message (str): Message without escaped characters
+        message_text (str): Raw text of the message (without the first command)
+        timezone (tzinfo): Time zone the dates are written in
 
     Returns:
-        str: Message with escaped characters
-    """
-
-    return (
-        message.replace('-', '\-')
-        .replace('!', '\!')
-        .replace('.', '\.')
-        .replace('[', '\[')
-        .replace(']', '\]')
-        .replace('(', '\(')
-        .replace(')', '\)')
-    )
\ No newline at end of file
+        List[Tuple[datetime, str, str]]: Parsed events (UTC date, title, description)
+        List[str]: Lines that could not be parsed
+    """
+
+    events: List[Tuple[datetime, str, str]] = []
+    failed_lines: List[str] = []
+    # The relative dates of a message are relative to the same time
+    now = utc_now()
+
+    for line in message_text.splitlines():
+        if not line.strip():
+            continue
+
+        if "|" not in line:
+            if events:
+                event_date, event_title, event_message = events[-1]
+                events[-1] = (event_date, event_title, f"{event_message}\n{line}")
+            else:
+                failed_lines.append(line)
+            continue
+
+        event_line = line.strip()
+        if event_line.startswith("/register"):
+            event_line = event_line[len("/register") :]
+
+        try:
+            events.append(parse_message_to_event(event_line, now, timezone))
+        except ValueError:
+            failed_lines.append(line)
+
+    return events, failed_lines
@@ -7,6 +7,7 @@ setup(
     name="reminderbot",
     version="1.0",
     packages=find_packages(),
+    python_requires=">=3.9",
     install_requires=[
         "click",
         "python-telegram-bot",
@@ -14,6 +15,8 @@ setup(
         "requests",
         "sqlalchemy",
         "psycopg2-binary",
+        # IANA time zones where the system has none (e.g. Windows)
+        "tzdata",
     ],
     entry_points="""
         [console_scripts]
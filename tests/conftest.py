@@ -0,0 +1,23 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Fixtures of the tests
+###############################################################################
+from __future__ import annotations
+from typing import Iterator
+
+import pytest
+
+from reminderbot import conf
+from reminderbot.database import Database
+
+
+@pytest.fixture
+def database() -> Iterator[Database]:
+    """Empty in-memory SQLite database, used as the database of the confs"""
+    previous = conf._database
+    conf._database = Database("sqlite://")
+    conf._database.init_database()
+    try:
+        yield conf._database
+    finally:
+        conf._database = previous
@@ -0,0 +1,101 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Fake Bot API server recording the calls of the bot
+###############################################################################
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Condition, Thread
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import parse_qs
+import json
+import time
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bot", "username": "reminderbot"}
+
+
+class FakeBotAPI:
+    """
+    Answer the Bot API methods used by the bot, as `telegram_api_url`
+
+    Every call is recorded as `(method, parameters)`.
+    """
+
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self._condition = Condition()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait_for(
+        self, predicate: Callable[[str, Dict[str, Any]], bool], timeout: float = 5
+    ) -> Dict[str, Any]:
+        """Wait for a call matching `predicate` and return its parameters"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                for method, params in self.calls:
+                    if predicate(method, params):
+                        return params
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Not called, got: {self.calls}")
+                self._condition.wait(remaining)
+
+    def _record(self, method: str, params: Dict[str, Any]) -> Any:
+        with self._condition:
+            self.calls.append((method, params))
+            self._condition.notify_all()
+
+        if method == "getMe":
+            return BOT_USER
+        if method == "getUpdates":
+            return []
+        if method == "sendMessage":
+            chat_id = int(params["chat_id"])
+            return {
+                "message_id": len(self.calls),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "group"},
+                "from": BOT_USER,
+                "text": params.get("text"),
+            }
+        return True
+
+    def _handler(self) -> type:
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    params = json.loads(body) if body else {}
+                except ValueError:
+                    params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+                result = api._record(method, params)
+                response = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            do_GET = do_POST
+
+        return Handler
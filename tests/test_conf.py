@@ -0,0 +1,33 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the options of the config file
+###############################################################################
+from __future__ import annotations
+from typing import Iterator
+
+import pytest
+
+from reminderbot import conf
+
+
+@pytest.fixture
+def shared_chats() -> Iterator[None]:
+    conf.config.read_dict({"CACHE": {"shared_chats": "True"}})
+    try:
+        yield
+    finally:
+        conf.config.remove_section("CACHE")
+
+
+def test_caches_of_own_chats() -> None:
+    assert conf.get_reply_cache_options() == (1024, 600)
+    assert conf.get_chat_cache_options() == (1024, 300)
+
+
+def test_caches_of_shared_chats(shared_chats) -> None:
+    assert conf.get_reply_cache_options() == (1024, 0)
+    assert conf.get_chat_cache_options() == (1024, conf.SHARED_CHATS_TTL)
+    assert conf.get_chat_filter_options() == (
+        conf.SHARED_CHATS_TTL,
+        conf.SHARED_CHATS_TTL,
+    )
@@ -0,0 +1,22 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the database connection
+###############################################################################
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+
+from reminderbot.database import Database
+from reminderbot.register import register_chat_db
+
+
+def test_in_memory_database_is_shared_between_threads(database: Database) -> None:
+    with ThreadPoolExecutor(8) as executor:
+        list(
+            executor.map(
+                lambda chat_id: register_chat_db(chat_id=chat_id, chat_name="Chat"),
+                range(200),
+            )
+        )
+
+    rows = database.engine.execute(database.chat.select()).fetchall()
+    assert len(rows) == 200
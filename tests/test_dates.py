@@ -0,0 +1,82 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the parsing of the dates of the events
+###############################################################################
+from __future__ import annotations
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from reminderbot.dates import parse_date
+from reminderbot.utils import parse_message_to_events
+
+NOW = datetime(2030, 5, 17, 18, 42, 31)
+
+
+@pytest.mark.parametrize(
+    "date_str",
+    [
+        "01-06-2030 10:30",
+        "1-6-2030 10:30",
+        "01/06/2030 10:30",
+        "01.06.2030 10:30",
+        "2030-06-01 10:30",
+        "2030-6-1T10:30",
+        " 01-06-2030   10:30 ",
+    ],
+)
+def test_absolute_dates(date_str: str) -> None:
+    assert parse_date(date_str, NOW) == datetime(2030, 6, 1, 10, 30)
+
+
+@pytest.mark.parametrize(
+    "date_str, expected",
+    [
+        ("today 20:15", datetime(2030, 5, 17, 20, 15)),
+        ("Tomorrow 7:05", datetime(2030, 5, 18, 7, 5)),
+        ("in 2h", datetime(2030, 5, 17, 20, 42)),
+        ("in 30m", datetime(2030, 5, 17, 19, 12)),
+        ("in 3d", datetime(2030, 5, 20, 18, 42)),
+        ("in 1w", datetime(2030, 5, 24, 18, 42)),
+        ("in 1 hour 30 minutes", datetime(2030, 5, 17, 20, 12)),
+        ("IN 2 Days", datetime(2030, 5, 19, 18, 42)),
+    ],
+)
+def test_relative_dates(date_str: str, expected: datetime) -> None:
+    assert parse_date(date_str, NOW) == expected
+
+
+@pytest.mark.parametrize(
+    "date_str",
+    [
+        "",
+        "tomorrow",
+        "01-06-2030",
+        "01-06/2030 10:30",
+        "31-02-2030 10:30",
+        "01-13-2030 10:30",
+        "01-06-2030 24:00",
+        "2030-06-01 10:60",
+        "in",
+        "in 2 years",
+        "in 99999999w",
+        "in 9999999d",
+    ],
+)
+def test_invalid_dates(date_str: str) -> None:
+    with pytest.raises(ValueError):
+        parse_date(date_str, NOW)
+
+
+def test_out_of_range_events_are_failed_lines() -> None:
+    events, failed_lines = parse_message_to_events(
+        "in 99999999w | Later | Never\n31-12-9999 23:59 | Last | Too late\n",
+        ZoneInfo("America/New_York"),
+    )
+
+    assert events == []
+    assert failed_lines == [
+        "in 99999999w | Later | Never",
+        "31-12-9999 23:59 | Last | Too late",
+    ]
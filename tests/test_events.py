@@ -0,0 +1,49 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the listing of the events
+###############################################################################
+from __future__ import annotations
+from datetime import datetime
+
+from reminderbot.events import DateFilter, list_events_db
+from reminderbot.register import (
+    register_chat_db,
+    register_event_db,
+    set_event_recurrence_db,
+)
+from reminderbot.utils import get_enabled_chat
+
+CHAT_ID = -1001
+
+
+def register_events(database) -> int:
+    register_chat_db(chat_id=CHAT_ID, chat_name="Chat")
+    chat_id = get_enabled_chat(CHAT_ID, "Chat")
+    register_event_db(chat_id, datetime(2029, 1, 1, 10, 0), "Weekly", "Every week")
+    register_event_db(chat_id, datetime(2031, 1, 1, 10, 0), "One-off", "Once")
+    weekly_id = database.engine.execute(database.reminder.select()).first()["id"]
+    set_event_recurrence_db(chat_id, weekly_id, "weekly")
+    return chat_id
+
+
+def test_next_events_merge_later_recurring_events(database) -> None:
+    chat_id = register_events(database)
+
+    events = list(list_events_db(chat_id, 5, DateFilter.future))
+
+    assert [event["title"] for event in events] == ["Weekly"] * 5
+    assert [event["date"] for event in events] == sorted(
+        event["date"] for event in events
+    )
+    assert events[0]["date"] == datetime(2029, 1, 1, 10, 0)
+
+
+def test_all_next_events_in_date_order(database) -> None:
+    chat_id = register_events(database)
+
+    events = list(list_events_db(chat_id, 0, DateFilter.future))
+    dates = [(event["date"], event["id"]) for event in events]
+
+    assert dates == sorted(dates)
+    assert events[0]["title"] == "Weekly"
+    assert "One-off" in [event["title"] for event in events]
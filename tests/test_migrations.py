@@ -0,0 +1,31 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the schema migrations
+###############################################################################
+from __future__ import annotations
+from datetime import datetime
+
+from reminderbot.migrations import unescape_reminder_markdown
+from reminderbot.register import register_chat_db, register_event_db
+from reminderbot.utils import get_enabled_chat
+
+CHAT_ID = -1001
+
+
+def test_unescape_reminder_markdown(database) -> None:
+    register_chat_db(chat_id=CHAT_ID, chat_name="Chat")
+    chat_id = get_enabled_chat(CHAT_ID, "Chat")
+    date = datetime(2030, 1, 1, 10, 0)
+    register_event_db(chat_id, date, "Meeting at 10\\.30", "Room \\(B\\-2\\)\\!")
+    register_event_db(chat_id, date, "Plain", "No escapes. At all!")
+
+    with database.engine.begin() as connection:
+        unescape_reminder_markdown(connection)
+
+    rows = database.engine.execute(
+        database.reminder.select().order_by(database.reminder.c.id)
+    ).fetchall()
+    assert [(row["title"], row["text"]) for row in rows] == [
+        ("Meeting at 10.30", "Room (B-2)!"),
+        ("Plain", "No escapes. At all!"),
+    ]
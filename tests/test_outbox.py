@@ -0,0 +1,61 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the queue of the messages sent by the bot
+###############################################################################
+from __future__ import annotations
+from threading import Lock
+from typing import Any, Dict, List
+import time
+
+from reminderbot.outbox import Outbox, reply_text
+
+
+class FakeMessage:
+    """Message recording the replies sent to it"""
+
+    chat_id = -1001
+
+    def __init__(self) -> None:
+        self.replies: Dict[str, Any] = {}
+
+    def reply_text(self, text: str, **kwargs) -> str:
+        self.replies = {"text": text, **kwargs}
+        return text
+
+
+def test_send_call_taking_a_chat_id() -> None:
+    def send_message(chat_id: int, text: str) -> Dict[str, Any]:
+        return {"chat_id": chat_id, "text": text}
+
+    outbox = Outbox(global_rate=1000, chat_rate=1000)
+    future = outbox.send(1, send_message, chat_id=1, text="Hi")
+
+    assert future.result(timeout=5) == {"chat_id": 1, "text": "Hi"}
+
+
+def test_reply_without_the_deleted_command() -> None:
+    message = FakeMessage()
+
+    reply_text(message, "Hi").result(timeout=5)  # type: ignore[arg-type]
+
+    assert message.replies == {"text": "Hi", "allow_sending_without_reply": True}
+
+
+def test_slow_calls_keep_the_order_of_the_chat() -> None:
+    events: List[str] = []
+    lock = Lock()
+
+    def send_page(page: int, delay: float) -> int:
+        with lock:
+            events.append(f"start {page}")
+        time.sleep(delay)
+        with lock:
+            events.append(f"end {page}")
+        return page
+
+    # The calls last longer than the interval between the messages of a chat
+    outbox = Outbox(global_rate=1000, chat_rate=100, workers=4)
+    futures = [outbox.send(1, send_page, page, 0.1 / page) for page in (1, 2, 3)]
+
+    assert [future.result(timeout=5) for future in futures] == [1, 2, 3]
+    assert events == ["start 1", "end 1", "start 2", "end 2", "start 3", "end 3"]
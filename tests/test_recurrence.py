@@ -0,0 +1,97 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the occurrences of the recurring events
+###############################################################################
+from __future__ import annotations
+from datetime import datetime
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from reminderbot.recurrence import is_occurrence, iter_occurrences, parse_recurrence
+
+
+def test_weekly_occurrences_between_dates() -> None:
+    occurrences = iter_occurrences(
+        datetime(2030, 1, 1, 10, 0),
+        "weekly",
+        after=datetime(2030, 1, 1, 10, 0),
+        before=datetime(2030, 1, 29, 10, 0),
+    )
+
+    assert list(occurrences) == [
+        datetime(2030, 1, 8, 10, 0),
+        datetime(2030, 1, 15, 10, 0),
+        datetime(2030, 1, 22, 10, 0),
+    ]
+
+
+def test_reverse_occurrences() -> None:
+    occurrences = iter_occurrences(
+        datetime(2030, 1, 1, 10, 0),
+        "daily",
+        before=datetime(2030, 1, 4, 10, 0),
+        reverse=True,
+    )
+
+    assert list(occurrences) == [
+        datetime(2030, 1, 3, 10, 0),
+        datetime(2030, 1, 2, 10, 0),
+        datetime(2030, 1, 1, 10, 0),
+    ]
+
+
+def test_reverse_occurrences_need_an_end() -> None:
+    with pytest.raises(ValueError):
+        next(iter_occurrences(datetime(2030, 1, 1), "daily", reverse=True))
+
+
+def test_monthly_occurrences_clamp_to_the_last_day() -> None:
+    occurrences = iter_occurrences(datetime(2030, 1, 31, 10, 0), "monthly")
+
+    assert list(islice(occurrences, 4)) == [
+        datetime(2030, 1, 31, 10, 0),
+        datetime(2030, 2, 28, 10, 0),
+        datetime(2030, 3, 31, 10, 0),
+        datetime(2030, 4, 30, 10, 0),
+    ]
+
+
+def test_yearly_occurrences_on_leap_days() -> None:
+    occurrences = iter_occurrences(datetime(2028, 2, 29, 10, 0), "yearly")
+
+    assert list(islice(occurrences, 2)) == [
+        datetime(2028, 2, 29, 10, 0),
+        datetime(2029, 2, 28, 10, 0),
+    ]
+
+
+def test_occurrences_keep_the_local_time_across_dst() -> None:
+    # 10:00 in Madrid is 09:00 UTC in winter and 08:00 UTC in summer
+    occurrences = iter_occurrences(
+        datetime(2030, 3, 24, 9, 0),
+        "weekly",
+        before=datetime(2030, 4, 8),
+        timezone=ZoneInfo("Europe/Madrid"),
+    )
+
+    assert list(occurrences) == [
+        datetime(2030, 3, 24, 9, 0),
+        datetime(2030, 3, 31, 8, 0),
+        datetime(2030, 4, 7, 8, 0),
+    ]
+
+
+def test_is_occurrence() -> None:
+    base = datetime(2030, 1, 1, 10, 0)
+
+    assert is_occurrence(base, "biweekly", datetime(2030, 1, 15, 10, 0))
+    assert not is_occurrence(base, "biweekly", datetime(2030, 1, 8, 10, 0))
+
+
+def test_parse_recurrence() -> None:
+    assert parse_recurrence(" Weekly ") == "weekly"
+    assert parse_recurrence("never") is None
+    with pytest.raises(ValueError):
+        parse_recurrence("hourly")
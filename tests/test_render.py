@@ -0,0 +1,31 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the rendering of the lists of events
+###############################################################################
+from __future__ import annotations
+from datetime import datetime
+
+from reminderbot.events import MESSAGE_MAX_LENGTH, render_messages
+from reminderbot.render import truncate_markdown_v2
+
+
+def test_long_lines_are_truncated_with_the_header() -> None:
+    header = "*All events:*\n"
+    events = [
+        {"id": 1, "date": datetime(2030, 1, 1, 10, 0), "title": "a." * 5000},
+        {"id": 2, "date": datetime(2030, 1, 2, 10, 0), "title": "b" * 5000},
+    ]
+
+    messages = list(render_messages(header, events))
+
+    assert len(messages) == 2
+    assert messages[0].startswith(header + "\n\\-\\[")
+    assert all(len(message) <= MESSAGE_MAX_LENGTH for message in messages)
+    assert messages[0].endswith("…* _<1\\>_")
+    assert messages[1].endswith("…* _<2\\>_")
+
+
+def test_truncate_keeps_the_escapes() -> None:
+    assert truncate_markdown_v2("a\\.b", 2) == "a"
+    assert truncate_markdown_v2("a\\.b", 3) == "a\\."
+    assert truncate_markdown_v2("\\\\\\\\", 3) == "\\\\"
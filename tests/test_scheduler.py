@@ -0,0 +1,76 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the delivery of the reminders
+###############################################################################
+from __future__ import annotations
+from datetime import timedelta
+from queue import Queue
+from typing import Any, Dict
+import sys
+
+from reminderbot.dates import utc_now
+from reminderbot.register import register_chat_db, register_event_db
+from reminderbot.scheduler import ReminderScheduler
+from reminderbot.utils import get_enabled_chat
+
+CHAT_ID = -1001
+
+
+class FakeBot:
+    """Bot recording the messages it sends"""
+
+    def __init__(self) -> None:
+        self.sent: Queue = Queue()
+
+    def send_message(self, **kwargs) -> Dict[str, Any]:
+        self.sent.put(kwargs)
+        return kwargs
+
+
+def test_add_skips_past_reminders(database) -> None:
+    scheduler = ReminderScheduler(None, timedelta(hours=1), batch_size=10)
+    # As if the window had been loaded until the end of the look-ahead
+    scheduler._cursor = (utc_now() + timedelta(hours=1), sys.maxsize)
+
+    past = utc_now() - timedelta(days=30)
+    future = utc_now() + timedelta(minutes=5)
+    scheduler.add(1, past)
+    scheduler.add(2, future)
+
+    assert scheduler._heap == [(future, 2)]
+
+
+def test_deliver_one_off_reminder(database) -> None:
+    register_chat_db(chat_id=CHAT_ID, chat_name="Chat")
+    date = utc_now().replace(second=0, microsecond=0) + timedelta(days=1)
+    register_event_db(get_enabled_chat(CHAT_ID, "Chat"), date, "Dinner", "At home")
+    event_id = database.engine.execute(database.reminder.select()).first()["id"]
+
+    bot = FakeBot()
+    scheduler = ReminderScheduler(bot, timedelta(hours=1), batch_size=10)
+    scheduler._deliver(event_id, date)
+
+    message = bot.sent.get(timeout=5)
+    assert message["chat_id"] == CHAT_ID
+    assert "Dinner" in message["text"]
+
+
+def test_refresh_keeps_the_reminders_behind_the_cursor(database) -> None:
+    register_chat_db(chat_id=CHAT_ID, chat_name="Chat")
+    chat_id = get_enabled_chat(CHAT_ID, "Chat")
+    date = utc_now().replace(microsecond=0) + timedelta(minutes=1)
+    for title in ("First", "Second", "Third"):
+        register_event_db(chat_id, date, title, "Same time")
+
+    refresh = timedelta(seconds=1)
+    scheduler = ReminderScheduler(None, timedelta(hours=1), 2, refresh)
+    scheduler._load_window()
+    assert [event_id for _date, event_id in scheduler._heap] == [1, 2]
+
+    # The first batch was delivered slower than the refresh
+    scheduler._heap.clear()
+    scheduler._scheduled.clear()
+    scheduler._refresh_window(date + timedelta(seconds=2), refresh)
+    scheduler._load_window()
+
+    assert scheduler._heap == [(date, 3)]
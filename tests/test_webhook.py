@@ -0,0 +1,98 @@
+###############################################################################
+# Project: Mort de Gana Bot
+# Descr: Tests of the webhook mode against a fake Bot API server
+###############################################################################
+from __future__ import annotations
+from socket import socket
+from typing import Iterator
+import json
+import time
+import urllib.request
+
+import pytest
+
+from reminderbot import conf
+from reminderbot.register import register_chat_db
+from tests.fake_bot_api import FakeBotAPI
+
+CHAT_ID = -1001
+
+
+def free_port() -> int:
+    with socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def fake_api() -> Iterator[FakeBotAPI]:
+    api = FakeBotAPI()
+    api.start()
+    try:
+        yield api
+    finally:
+        api.stop()
+
+
+@pytest.fixture
+def webhook_config(fake_api: FakeBotAPI) -> Iterator[int]:
+    port = free_port()
+    conf.config.read_dict(
+        {
+            "DEFAULT": {"telegram_api_url": fake_api.url},
+            "WEBHOOK": {"listen": "127.0.0.1", "port": str(port), "path": "hook"},
+        }
+    )
+    try:
+        yield port
+    finally:
+        conf.config.remove_option("DEFAULT", "telegram_api_url")
+        conf.config.remove_section("WEBHOOK")
+
+
+def post_update(port: int, update: dict) -> None:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/hook",
+        data=json.dumps(update).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    urllib.request.urlopen(request, timeout=5).close()
+
+
+def test_webhook_replies_through_the_api(database, fake_api, webhook_config) -> None:
+    from telegram.ext import Updater
+
+    from reminderbot.bot import init_bot
+
+    register_chat_db(chat_id=CHAT_ID, chat_name="Webhook chat")
+
+    updater = Updater("123:fake", use_context=True, **conf.get_telegram_api_options())
+    init_bot(updater.dispatcher, run_async=False)
+    updater.start_webhook(**conf.get_webhook_options())
+    try:
+        webhook = fake_api.wait_for(lambda method, _params: method == "setWebhook")
+        assert webhook["url"].endswith(f":{webhook_config}/hook")
+
+        post_update(
+            webhook_config,
+            {
+                "update_id": 1,
+                "message": {
+                    "message_id": 10,
+                    "date": int(time.time()),
+                    "chat": {"id": CHAT_ID, "type": "group", "title": "Webhook chat"},
+                    "from": {"id": 2, "is_bot": False, "first_name": "User"},
+                    "text": "/next",
+                    "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+                },
+            },
+        )
+
+        reply = fake_api.wait_for(
+            lambda method, params: method == "sendMessage"
+            and int(params["chat_id"]) == CHAT_ID
+        )
+        assert "next events" in reply["text"]
+
+    finally:
+        updater.stop()